@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import itertools
 import logging
 import math
@@ -6,24 +7,42 @@ import random
 import time
 import warnings
 from collections import Counter
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+
+import numpy as np
 from s2clientprotocol import sc2api_pb2 as sc_pb
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial.distance import cdist
 
 from .cache import property_cache_forever, property_cache_once_per_frame, property_cache_once_per_frame_no_copy
 from .constants import (
-    FakeEffectID,
     abilityid_to_unittypeid,
-    geyser_ids,
-    mineral_ids,
     TERRAN_TECH_REQUIREMENT,
     PROTOSS_TECH_REQUIREMENT,
     ZERG_TECH_REQUIREMENT,
-    ALL_GAS,
     EQUIVALENTS_FOR_TECH_PROGRESS,
     TERRAN_STRUCTURES_REQUIRE_SCV,
 )
-from .data import ActionResult, Alert, Race, Result, Target, race_gas, race_townhalls, race_worker
+from .data import ActionResult, Alert, Race, Result, Target, race_gas
 from .distances import DistanceCalculation
+from .frame_store import (
+    FrameStore,
+    GroupDiff,
+    GROUP_DESTRUCTABLES,
+    GROUP_ENEMY_STRUCTURES,
+    GROUP_ENEMY_UNITS,
+    GROUP_GAS_BUILDINGS,
+    GROUP_LARVA,
+    GROUP_MINERAL_FIELD,
+    GROUP_RESOURCES,
+    GROUP_STRUCTURES,
+    GROUP_TOWNHALLS,
+    GROUP_UNITS,
+    GROUP_VESPENE_GEYSER,
+    GROUP_WATCHTOWERS,
+    GROUP_WORKERS,
+)
 from .game_data import AbilityData, GameData
 
 from .dicts.unit_trained_from import UNIT_TRAINED_FROM
@@ -32,12 +51,14 @@ from .dicts.upgrade_researched_from import UPGRADE_RESEARCHED_FROM
 from .dicts.unit_research_abilities import RESEARCH_INFO
 
 # Imports for mypy and pycharm autocomplete as well as sphinx autodocumentation
-from .game_state import Blip, EffectData, GameState
+from .game_state import Blip, GameState
+from .map_cache import MapAnalysis, load_map_analysis, save_map_analysis
 from .ids.ability_id import AbilityId
 from .ids.unit_typeid import UnitTypeId
 from .ids.upgrade_id import UpgradeId
-from .pixel_map import PixelMap
+from .placement import PlacementSolver
 from .position import Point2, Point3
+from .production_index import ProductionIndex
 from .unit import Unit
 from .units import Units
 from .game_data import Cost
@@ -45,6 +66,33 @@ from .unit_command import UnitCommand
 
 logger = logging.getLogger(__name__)
 
+# Event handlers that are called once per event, see BotAI.issue_events
+EVENT_HANDLERS = (
+    "on_unit_destroyed",
+    "on_unit_created",
+    "on_unit_type_changed",
+    "on_building_construction_started",
+    "on_building_construction_complete",
+    "on_upgrade_complete",
+    "on_unit_took_damage",
+    "on_enemy_unit_entered_vision",
+    "on_enemy_unit_left_vision",
+)
+# Event handlers that are called once per step with a list of all events of that kind
+BATCHED_EVENT_HANDLERS = (
+    "on_units_destroyed",
+    "on_units_created",
+    "on_units_type_changed",
+    "on_units_took_damage",
+    "on_enemy_units_entered_vision",
+    "on_enemy_units_left_vision",
+)
+
+# Offsets that are applied to the center of a resource group to find the expansion location, as array of shape (n, 2)
+EXPANSION_LOCATION_OFFSETS = np.array(
+    [(x, y) for x, y in itertools.product(range(-7, 8), repeat=2) if math.hypot(x, y) <= 8], dtype=np.float64
+)
+
 if TYPE_CHECKING:
     from .game_info import GameInfo, Ramp
     from .client import Client
@@ -65,24 +113,30 @@ class BotAI(DistanceCalculation):
             # otherwise set it to None
             self.opponent_id: str = None
         # Select distance calculation method, see distances.py: _distances_override_functions function
+        # Can also be set to "auto" to let the bot select the fastest method each frame
         if not hasattr(self, "distance_calculation_method"):
-            self.distance_calculation_method: int = 2
+            self.distance_calculation_method: Union[int, str] = 2
+        # If True, the pathing grid is updated in place each step and only the tiles that changed are written, instead of being recreated
+        # Changes made to 'self.game_info.pathing_grid' by the bot then persist until the game changes these tiles
+        if not hasattr(self, "incremental_pathing_grid"):
+            self.incremental_pathing_grid: bool = False
+        # When main.py requests the game info each step to refresh the pathing grid:
+        # "always" every step, "never" only at game start, "structures" when structures or neutral units (e.g. rocks and minerals) were added, removed or changed type,
+        # or an int N to refresh every N game loops
+        if not hasattr(self, "game_info_refresh_policy"):
+            self.game_info_refresh_policy: Union[int, str] = "always"
+        self._game_info_refresh_loop: int = -1
+        # If True, find_placement checks the candidate positions on the placement grid, structures and creep of the current frame first
+        # and sends the positions of all rings that fit to the game in one query, instead of querying ring by ring
+        # If the game rejects all of them, the rings are still queried one by one
+        if not hasattr(self, "local_placement_check"):
+            self.local_placement_check: bool = True
+        # Sorted array of (tag, type id) of the structures and neutral units at the last refresh, used by the "structures" policy
+        self._game_info_refresh_structures: Optional[np.ndarray] = None
         # This value will be set to True by main.py in self._prepare_start if game is played in realtime (if true, the bot will have limited time per step)
         self.realtime: bool = False
-        self.all_units: Units = Units([], self)
-        self.units: Units = Units([], self)
-        self.workers: Units = Units([], self)
-        self.townhalls: Units = Units([], self)
-        self.structures: Units = Units([], self)
-        self.gas_buildings: Units = Units([], self)
-        self.enemy_units: Units = Units([], self)
-        self.enemy_structures: Units = Units([], self)
-        self.resources: Units = Units([], self)
-        self.destructables: Units = Units([], self)
-        self.watchtowers: Units = Units([], self)
-        self.mineral_field: Units = Units([], self)
-        self.vespene_geyser: Units = Units([], self)
-        self.larva: Units = Units([], self)
+        # Columnar unit data of the current frame, the unit collections below ('self.units', 'self.structures', ...) are read from it
+        self._frame_store: FrameStore = FrameStore(self)
         self.techlab_tags: Set[int] = set()
         self.reactor_tags: Set[int] = set()
         self.minerals: int = None
@@ -99,10 +153,13 @@ class BotAI(DistanceCalculation):
         self.blips: Set[Blip] = set()
         self._units_created: Counter = Counter()
         self._unit_tags_seen_this_game: Set[int] = set()
-        self._units_previous_map: Dict[int, Unit] = dict()
-        self._structures_previous_map: Dict[int, Unit] = dict()
-        self._enemy_units_previous_map: Dict[int, Unit] = dict()
-        self._enemy_structures_previous_map: Dict[int, Unit] = dict()
+        # Frame store of the previous frame, required for events
+        self._previous_frame_store: FrameStore = self._frame_store
+        # Names of the event handlers the bot class overrides and the event issuers that run each step, set in _prepare_start
+        self._subscribed_events: Set[str] = set()
+        self._event_issuers: List[Callable[[], Awaitable[None]]] = []
+        # Events of this step for the batched event handlers, as dict of handler name: list of events
+        self._batched_events: Dict[str, list] = {}
         self._previous_upgrades: Set[UpgradeId] = set()
         self._time_before_step: float = None
         self._time_after_step: float = None
@@ -158,6 +215,96 @@ class BotAI(DistanceCalculation):
         """ See client.py """
         return self._client
 
+    @property
+    def all_units(self) -> Units:
+        """ All units of the current frame: own, enemy and neutral units and structures. Does not contain blips. """
+        return self._frame_store.all_units
+
+    @property
+    def units(self) -> Units:
+        """ Own units, excluding structures. """
+        return self._frame_store.group(GROUP_UNITS)
+
+    @property
+    def structures(self) -> Units:
+        """ Own structures. """
+        return self._frame_store.group(GROUP_STRUCTURES)
+
+    @property
+    def workers(self) -> Units:
+        """ Own workers: SCVs, probes or drones. """
+        return self._frame_store.group(GROUP_WORKERS)
+
+    @property
+    def townhalls(self) -> Units:
+        """ Own townhalls of the bot's race. """
+        return self._frame_store.group(GROUP_TOWNHALLS)
+
+    @property
+    def gas_buildings(self) -> Units:
+        """ Own refineries, assimilators and extractors. """
+        return self._frame_store.group(GROUP_GAS_BUILDINGS)
+
+    @property
+    def larva(self) -> Units:
+        """ Own larva. """
+        return self._frame_store.group(GROUP_LARVA)
+
+    @property
+    def enemy_units(self) -> Units:
+        """ Visible enemy units, excluding structures. """
+        return self._frame_store.group(GROUP_ENEMY_UNITS)
+
+    @property
+    def enemy_structures(self) -> Units:
+        """ Visible enemy structures. """
+        return self._frame_store.group(GROUP_ENEMY_STRUCTURES)
+
+    @property
+    def mineral_field(self) -> Units:
+        """ Mineral fields that are in vision or were scouted. """
+        return self._frame_store.group(GROUP_MINERAL_FIELD)
+
+    @property
+    def vespene_geyser(self) -> Units:
+        """ Vespene geysers that are in vision or were scouted. """
+        return self._frame_store.group(GROUP_VESPENE_GEYSER)
+
+    @property
+    def resources(self) -> Units:
+        """ Mineral fields and vespene geysers. """
+        return self._frame_store.group(GROUP_RESOURCES)
+
+    @property
+    def destructables(self) -> Units:
+        """ Destructable rocks and other neutral destructable units. """
+        return self._frame_store.group(GROUP_DESTRUCTABLES)
+
+    @property
+    def watchtowers(self) -> Units:
+        """ Xel'naga towers. """
+        return self._frame_store.group(GROUP_WATCHTOWERS)
+
+    @property
+    def _units_previous_map(self) -> Dict[int, Unit]:
+        """ Own units of the previous frame as dict of tag: unit. """
+        return self._previous_frame_store.group_tag_map(GROUP_UNITS)
+
+    @property
+    def _structures_previous_map(self) -> Dict[int, Unit]:
+        """ Own structures of the previous frame as dict of tag: unit. """
+        return self._previous_frame_store.group_tag_map(GROUP_STRUCTURES)
+
+    @property
+    def _enemy_units_previous_map(self) -> Dict[int, Unit]:
+        """ Enemy units of the previous frame as dict of tag: unit. """
+        return self._previous_frame_store.group_tag_map(GROUP_ENEMY_UNITS)
+
+    @property
+    def _enemy_structures_previous_map(self) -> Dict[int, Unit]:
+        """ Enemy structures of the previous frame as dict of tag: unit. """
+        return self._previous_frame_store.group_tag_map(GROUP_ENEMY_STRUCTURES)
+
     @property
     def larva_count(self):
         """ Replacement for self.state.common.larva_count https://github.com/Blizzard/s2client-proto/blob/d3d18392f9d7c646067d447df0c936a8ca57d587/s2clientprotocol/sc2api.proto#L614 """
@@ -256,63 +403,57 @@ class BotAI(DistanceCalculation):
 
         # Idea: create a group for every resource, then merge these groups if
         # any resource in a group is closer than a threshold to any resource of another group
+        # This is single linkage clustering: the groups are the connected components of the graph
+        # in which two resources are connected if they are closer than the threshold
 
         # Distance we group resources by
         resource_spread_threshold = 8.5
         geysers = self.vespene_geyser
-        # Create a group for every resource
-        resource_groups = [
-            [resource]
-            for resource in self.resources
-            if resource.name != "MineralField450"  # dont use low mineral count patches
-        ]
-        # Loop the merging process as long as we change something
-        merged_group = True
-        while merged_group:
-            merged_group = False
-            # Check every combination of two groups
-            for group_a, group_b in itertools.combinations(resource_groups, 2):
-                # Check if any pair of resource of these groups is closer than threshold together
-                if any(
-                    resource_a.distance_to(resource_b) <= resource_spread_threshold
-                    for resource_a, resource_b in itertools.product(group_a, group_b)
-                ):
-                    # Remove the single groups and add the merged group
-                    resource_groups.remove(group_a)
-                    resource_groups.remove(group_b)
-                    resource_groups.append(group_a + group_b)
-                    merged_group = True
-                    break
+        resources = self.resources.filter(
+            lambda resource: resource.name != "MineralField450"  # dont use low mineral count patches
+        )
+        if not resources:
+            return {}
+        resource_positions = resources.positions.astype(np.float64)
+        resource_is_geyser = np.array([resource in geysers for resource in resources], dtype=bool)
+        close_resources = cdist(resource_positions, resource_positions) <= resource_spread_threshold
+        group_count, resource_group_ids = connected_components(csr_matrix(close_resources), directed=False)
         # Distance offsets we apply to center of each resource group to find expansion position
-        offset_range = 7
-        offsets = [
-            (x, y)
-            for x, y in itertools.product(range(-offset_range, offset_range + 1), repeat=2)
-            if math.hypot(x, y) <= 8
-        ]
+        offsets = EXPANSION_LOCATION_OFFSETS
+        placement_grid = self._game_info.placement_grid.data_numpy
+        grid_height, grid_width = placement_grid.shape
         # Dict we want to return
         centers = {}
         # For every resource group:
-        for resources in resource_groups:
-            # Possible expansion points
-            amount = len(resources)
+        for group_id in range(group_count):
+            group_indices = np.flatnonzero(resource_group_ids == group_id)
+            group_positions = resource_positions[group_indices]
             # Calculate center, round and add 0.5 because expansion location will have (x.5, y.5)
             # coordinates because bases have size 5.
-            center_x = int(sum(resource.position.x for resource in resources) / amount) + 0.5
-            center_y = int(sum(resource.position.y for resource in resources) / amount) + 0.5
-            possible_points = (Point2((offset[0] + center_x, offset[1] + center_y)) for offset in offsets)
-            # Filter out points that are too near
-            possible_points = (
-                point
-                for point in possible_points
-                # Check if point can be built on
-                if self._game_info.placement_grid[point.rounded] == 1
-                # Check if all resources have enough space to point
-                and all(point.distance_to(resource) > (7 if resource in geysers else 6) for resource in resources)
+            center = np.floor(group_positions.sum(axis=0) / len(group_indices)) + 0.5
+            # Possible expansion points, array of shape (offsets, 2)
+            possible_points = center + offsets
+            grid_points = np.floor(possible_points).astype(np.int64)
+            in_grid = (
+                (grid_points[:, 0] >= 0)
+                & (grid_points[:, 0] < grid_width)
+                & (grid_points[:, 1] >= 0)
+                & (grid_points[:, 1] < grid_height)
             )
+            # Check if point can be built on
+            can_be_built_on = np.zeros(len(possible_points), dtype=bool)
+            can_be_built_on[in_grid] = placement_grid[grid_points[in_grid, 1], grid_points[in_grid, 0]] == 1
+            # Distances of shape (offsets, resources)
+            distances = cdist(possible_points, group_positions)
+            # Check if all resources have enough space to point
+            minimum_distances = np.where(resource_is_geyser[group_indices], 7, 6)
+            valid_points = can_be_built_on & (distances > minimum_distances).all(axis=1)
+            if not valid_points.any():
+                continue
             # Choose best fitting point
-            result = min(possible_points, key=lambda point: sum(point.distance_to(resource) for resource in resources))
-            centers[result] = resources
+            scores = np.where(valid_points, distances.sum(axis=1), np.inf)
+            result = Point2(possible_points[int(np.argmin(scores))].tolist())
+            centers[result] = resources.subgroup(resources[i] for i in group_indices.tolist())
         return centers
 
     @property
@@ -403,6 +544,8 @@ class BotAI(DistanceCalculation):
 
         closest = None
         distance = math.inf
+        startp = self._game_info.player_start_location
+        free_locations: List[Point2] = []
         for el in self.expansion_locations:
 
             def is_near_to_expansion(t):
@@ -411,9 +554,11 @@ class BotAI(DistanceCalculation):
             if any(map(is_near_to_expansion, self.townhalls)):
                 # already taken
                 continue
+            free_locations.append(el)
 
-            startp = self._game_info.player_start_location
-            d = await self._client.query_pathing(startp, el)
+        # The pathing queries to all free locations are sent together in one query request
+        distances = await asyncio.gather(*(self._client.query_pathing(startp, el) for el in free_locations))
+        for el, d in zip(free_locations, distances):
             if d is None:
                 continue
 
@@ -784,6 +929,12 @@ class BotAI(DistanceCalculation):
             if worker and (await self.can_place(UnitTypeId.BARRACKS, barracks_placement_position):
                 self.do(worker.build(UnitTypeId.BARRACKS, barracks_placement_position))
 
+            # Placement checks that are awaited together are sent to the game in one query request
+            pool_placeable, evo_placeable = await asyncio.gather(
+                self.can_place(UnitTypeId.SPAWNINGPOOL, pool_position),
+                self.can_place(UnitTypeId.EVOLUTIONCHAMBER, evo_position),
+            )
+
         :param building:
         :param position: """
         building_type = type(building)
@@ -826,34 +977,53 @@ class BotAI(DistanceCalculation):
         else:  # AbilityId
             building = self._game_data.abilities[building.value]
 
-        if await self.can_place(building, near):
-            return near
-
-        if max_distance == 0:
-            return None
-
+        # The first ring is the target position itself
+        rings: List[List[Point2]] = [[near]]
         for distance in range(placement_step, max_distance, placement_step):
-            possible_positions = [
-                Point2(p).offset(near).to2
-                for p in (
-                    [(dx, -distance) for dx in range(-distance, distance + 1, placement_step)]
-                    + [(dx, distance) for dx in range(-distance, distance + 1, placement_step)]
-                    + [(-distance, dy) for dy in range(-distance, distance + 1, placement_step)]
-                    + [(distance, dy) for dy in range(-distance, distance + 1, placement_step)]
-                )
-            ]
-            res = await self._client.query_building_placement(building, possible_positions)
-            possible = [p for r, p in zip(res, possible_positions) if r == ActionResult.Success]
-            if not possible:
-                continue
-
+            rings.append(
+                [
+                    Point2(p).offset(near).to2
+                    for p in (
+                        [(dx, -distance) for dx in range(-distance, distance + 1, placement_step)]
+                        + [(dx, distance) for dx in range(-distance, distance + 1, placement_step)]
+                        + [(-distance, dy) for dy in range(-distance, distance + 1, placement_step)]
+                        + [(distance, dy) for dy in range(-distance, distance + 1, placement_step)]
+                    )
+                ]
+            )
+        def choose(ring_index: int, possible: List[Point2]) -> Point2:
+            if ring_index == 0:
+                return near
             if random_alternative:
                 return random.choice(possible)
-            else:
-                return min(possible, key=lambda p: p.distance_to_point2(near))
+            return min(possible, key=lambda p: p.distance_to_point2(near))
+
+        if self.local_placement_check:
+            # Check all rings locally at once, then the positions of all rings that fit are confirmed by the game in one query
+            positions = [position for ring in rings for position in ring]
+            placeable = self._placement_solver.is_placeable(building, np.array(positions, dtype=np.float64))
+            if placeable is not None and placeable.any():
+                ring_indices = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])[placeable].tolist()
+                candidates = [position for position, fits in zip(positions, placeable.tolist()) if fits]
+                res = await self._client.query_building_placement(building, candidates)
+                confirmed = [
+                    (ring_index, p)
+                    for ring_index, p, r in zip(ring_indices, candidates, res)
+                    if r == ActionResult.Success
+                ]
+                if confirmed:
+                    # The candidates are in ring order, so the first confirmed position is in the closest ring
+                    closest_ring = confirmed[0][0]
+                    return choose(closest_ring, [p for ring_index, p in confirmed if ring_index == closest_ring])
+
+        # Without the local check, or if the game rejected every position that fit locally, the rings are queried in order
+        for ring_index, possible_positions in enumerate(rings):
+            res = await self._client.query_building_placement(building, possible_positions)
+            possible = [p for r, p in zip(res, possible_positions) if r == ActionResult.Success]
+            if possible:
+                return choose(ring_index, possible)
         return None
 
-    # TODO: improve using cache per frame
     def already_pending_upgrade(self, upgrade_type: UpgradeId) -> float:
         """ Check if an upgrade is being researched
 
@@ -872,33 +1042,14 @@ class BotAI(DistanceCalculation):
         assert isinstance(upgrade_type, UpgradeId), f"{upgrade_type} is no UpgradeId"
         if upgrade_type in self.state.upgrades:
             return 1
-        creationAbilityID = self._game_data.upgrades[upgrade_type.value].research_ability.exact_id
-        for structure in self.structures.filter(lambda unit: unit.is_ready):
-            for order in structure.orders:
-                if order.ability.exact_id == creationAbilityID:
-                    return order.progress
-        return 0
-
-    @property_cache_once_per_frame_no_copy
-    def _abilities_all_units(self) -> Tuple[Counter, Dict[UnitTypeId, float]]:
-        """ Cache for the already_pending function, includes protoss units warping in,
-        all units in production and all structures, and all morphs """
-        abilities_amount = Counter()
-        max_build_progress: Dict[UnitTypeId, float] = {}
-        for unit in self.units + self.structures:  # type: Unit
-            for order in unit.orders:
-                abilities_amount[order.ability] += 1
-            if not unit.is_ready:
-                if self.race != Race.Terran or not unit.is_structure:
-                    # If an SCV is constructing a building, already_pending would count this structure twice
-                    # (once from the SCV order, and once from "not structure.is_ready")
-                    creation_ability: AbilityData = self._game_data.units[unit.type_id.value].creation_ability
-                    abilities_amount[creation_ability] += 1
-                    max_build_progress[creation_ability] = max(
-                        max_build_progress.get(creation_ability, 0), unit.build_progress
-                    )
+        research_ability_id: int = self._game_data.upgrades[upgrade_type.value].research_ability.exact_id.value
+        return self._production_index.upgrade_progress(research_ability_id)
 
-        return abilities_amount, max_build_progress
+    def _creation_ability_id(self, unit_type_value: int) -> int:
+        """ Returns the exact id value of the creation ability of a unit type as it is used by the production index,
+        0 if the unit type has no creation ability. """
+        creation_ability: Optional[AbilityData] = self._game_data.units[unit_type_value].creation_ability
+        return creation_ability.exact_id.value if creation_ability is not None else 0
 
     def structure_type_build_progress(self, structure_type: Union[UnitTypeId, int]) -> float:
         """
@@ -939,12 +1090,11 @@ class BotAI(DistanceCalculation):
         equiv_values: Set[int] = {structure_type_value} | {
             s_type.value for s_type in EQUIVALENTS_FOR_TECH_PROGRESS.get(structure_type, set())
         }
-        creation_ability: AbilityData = self._game_data.units[structure_type_value].creation_ability
-        max_value = max(
-            [s.build_progress for s in self.structures if s._proto.unit_type in equiv_values]
-            + [self._abilities_all_units[1].get(creation_ability, 0)]
+        production_index = self._production_index
+        return max(
+            production_index.structure_progress(equiv_values),
+            production_index.max_progress(self._creation_ability_id(structure_type_value)),
         )
-        return max_value
 
     def tech_requirement_progress(self, structure_type: UnitTypeId) -> float:
         """ Returns the tech requirement progress for a specific building
@@ -1001,8 +1151,7 @@ class BotAI(DistanceCalculation):
         """
         if isinstance(unit_type, UpgradeId):
             return self.already_pending_upgrade(unit_type)
-        ability = self._game_data.units[unit_type.value].creation_ability
-        return self._abilities_all_units[0][ability]
+        return self._production_index.count(self._creation_ability_id(unit_type.value))
 
     @property_cache_once_per_frame_no_copy
     def _worker_orders(self) -> Counter:
@@ -1508,6 +1657,53 @@ class BotAI(DistanceCalculation):
         pos = pos.position.to2.rounded
         return self.state.creep[pos] == 1
 
+    @staticmethod
+    def _grid_positions(positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Converts Units or a list of points to an array of shape (n, 2) for the grid lookups below. """
+        if isinstance(positions, Units):
+            return positions.positions
+        return np.asarray(positions)
+
+    def get_terrain_height_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'get_terrain_height', but for many positions at once.
+        Returns an array with the terrain height of each position.
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        return self._game_info.terrain_height.values_at(self._grid_positions(positions))
+
+    def get_terrain_z_height_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'get_terrain_z_height', but for many positions at once.
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        heights = self._game_info.terrain_height.values_at(self._grid_positions(positions)).astype(np.float64)
+        return -16 + 32 * heights / 255
+
+    def in_placement_grid_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'in_placement_grid', but for many positions at once.
+        Returns a boolean array which is True for each position where you can place something.
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        return self._game_info.placement_grid.values_at(self._grid_positions(positions)) == 1
+
+    def in_pathing_grid_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'in_pathing_grid', but for many positions at once.
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        return self._game_info.pathing_grid.values_at(self._grid_positions(positions)) == 1
+
+    def is_visible_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'is_visible', but for many positions at once.
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        return self.state.visibility.values_at(self._grid_positions(positions)) == 2
+
+    def has_creep_array(self, positions: Union[np.ndarray, Units, List[Point2]]) -> np.ndarray:
+        """ Same as 'has_creep', but for many positions at once.
+        Example usage: creep_tumors_on_creep = tumor_positions[self.has_creep_array(tumor_positions)]
+
+        :param positions: Array of shape (n, 2), Units or a list of points """
+        return self.state.creep.values_at(self._grid_positions(positions)) == 1
+
     def _prepare_start(self, client, player_id, game_info, game_data, realtime: bool = False):
         """
         Ran until game start to set game and player data.
@@ -1529,33 +1725,86 @@ class BotAI(DistanceCalculation):
         if len(self._game_info.player_races) == 2:
             self.enemy_race: Race = Race(self._game_info.player_races[3 - self.player_id])
 
-        self._distances_override_functions(self.distance_calculation_method)
+        if self.distance_calculation_method == "auto":
+            self._calibrate_distance_methods()
+        else:
+            self._distances_override_functions(self.distance_calculation_method)
+        self._compile_event_pipeline()
+        self._placement_solver: PlacementSolver = PlacementSolver(self)
 
     def _prepare_first_step(self):
         """First step extra preparations. Must not be called before _prepare_step."""
+        # Load ramps, vision blockers and expansion locations of this map from the map cache if it was analyzed before
+        map_analysis = load_map_analysis(self._game_info)
+        # The cache file is written again if it is missing, was rejected or its expansion locations do not match this game
+        save_analysis = map_analysis is None
         if self.townhalls:
             self._game_info.player_start_location = self.townhalls.first.position
+            if map_analysis is not None:
+                expansion_locations = map_analysis.create_expansion_locations(self.resources)
+                if expansion_locations is not None:
+                    self._cache_expansion_locations = expansion_locations
+                else:
+                    save_analysis = True
             # Calculate and cache expansion locations forever inside 'self._cache_expansion_locations', this is done to prevent a bug when this is run and cached later in the game
             _ = self.expansion_locations
-        self._game_info.map_ramps, self._game_info.vision_blockers = self._game_info._find_ramps_and_vision_blockers()
+        if map_analysis is not None:
+            self._game_info.map_ramps = map_analysis.create_ramps(self._game_info)
+            self._game_info.vision_blockers = map_analysis.vision_blockers
+        else:
+            self._game_info.map_ramps, self._game_info.vision_blockers = self._game_info._find_ramps_and_vision_blockers()
+        if save_analysis and self.townhalls:
+            save_map_analysis(
+                self._game_info, MapAnalysis.from_game_info(self._game_info, self._cache_expansion_locations)
+            )
+        self._time_before_step: float = time.perf_counter()
+
+    def _should_refresh_game_info(self, state: GameState) -> bool:
+        """ Called from main.py after _prepare_step, decides by 'self.game_info_refresh_policy' if the game info is requested
+        to refresh the pathing grid in this step, see '_update_pathing_grid'.
+
+        :param state: """
+        policy = self.game_info_refresh_policy
+        if policy == "always":
+            return True
+        if policy == "never":
+            return self._game_info_refresh_loop == -1
+        if policy == "structures":
+            store = self._frame_store
+            # Structures of all players and neutral units like minerals and rocks, Alliance.Neutral.value = 3
+            is_relevant = store.is_structure | (store.alliance == 3)
+            tags = store.tag[is_relevant]
+            order = np.argsort(tags)
+            structures = np.column_stack((tags[order], store.type_id[is_relevant][order]))
+            previous_structures = self._game_info_refresh_structures
+            if previous_structures is not None and np.array_equal(structures, previous_structures):
+                return False
+            self._game_info_refresh_structures = structures
+            return True
+        assert isinstance(policy, int) and policy > 0, f"Unknown game info refresh policy {policy}"
+        return self._game_info_refresh_loop == -1 or state.game_loop - self._game_info_refresh_loop >= policy
+
+    def _update_pathing_grid(self, proto_game_info):
+        """ Updates the pathing grid from a game info response of the current step.
+
+        :param proto_game_info: """
+        self._game_info_refresh_loop = self.state.game_loop
+        self._game_info._update_pathing_grid(
+            proto_game_info.game_info.start_raw.pathing_grid, incremental=self.incremental_pathing_grid
+        )
         self._time_before_step: float = time.perf_counter()
 
     def _prepare_step(self, state, proto_game_info):
         """
         :param state:
-        :param proto_game_info:
+        :param proto_game_info: None if the game info was not requested together with the observation, then main.py may
+            still request it after this function, see '_should_refresh_game_info'
         """
         # Set attributes from new state before on_step."""
         self.state: GameState = state  # See game_state.py
-        # update pathing grid
-        self._game_info.pathing_grid: PixelMap = PixelMap(
-            proto_game_info.game_info.start_raw.pathing_grid, in_bits=True, mirrored=False
-        )
+        self._game_info.changed_pathing_tiles = set()
         # Required for events, needs to be before self.units are initialized so the old units are stored
-        self._units_previous_map: Dict = {unit.tag: unit for unit in self.units}
-        self._structures_previous_map: Dict = {structure.tag: structure for structure in self.structures}
-        self._enemy_units_previous_map: Dict = {unit.tag: unit for unit in self.enemy_units}
-        self._enemy_structures_previous_map: Dict = {structure.tag: structure for structure in self.enemy_structures}
+        self._previous_frame_store = self._frame_store
 
         self._prepare_units()
         self.minerals: int = state.common.minerals
@@ -1574,104 +1823,25 @@ class BotAI(DistanceCalculation):
 
         self.idle_worker_count: int = state.common.idle_worker_count
         self.army_count: int = state.common.army_count
+        if proto_game_info is not None:
+            self._update_pathing_grid(proto_game_info)
         self._time_before_step: float = time.perf_counter()
 
     def _prepare_units(self):
+        # Sort all units of the observation into the frame store in one pass, 'Unit' objects are created lazily when accessed
+        self._frame_store: FrameStore = FrameStore(self, self.state.observation_raw.units)
         # Set of enemy units detected by own sensor tower, as blips have less unit information than normal visible units
-        self.blips: Set[Blip] = set()
-        self.units: Units = Units([], self)
-        self.structures: Units = Units([], self)
-        self.enemy_units: Units = Units([], self)
-        self.enemy_structures: Units = Units([], self)
-        self.mineral_field: Units = Units([], self)
-        self.vespene_geyser: Units = Units([], self)
-        self.resources: Units = Units([], self)
-        self.destructables: Units = Units([], self)
-        self.watchtowers: Units = Units([], self)
-        self.all_units: Units = Units([], self)
-        self.workers: Units = Units([], self)
-        self.townhalls: Units = Units([], self)
-        self.gas_buildings: Units = Units([], self)
-        self.larva: Units = Units([], self)
-        self.techlab_tags: Set[int] = set()
-        self.reactor_tags: Set[int] = set()
-
-        for unit in self.state.observation_raw.units:
-            if unit.is_blip:
-                self.blips.add(Blip(unit))
-            else:
-                unit_type: int = unit.unit_type
-                # Convert these units to effects: reaper grenade, parasitic bomb dummy, forcefield
-                if unit_type in FakeEffectID:
-                    self.state.effects.add(EffectData(unit, fake=True))
-                    continue
-                unit_obj = Unit(unit, self)
-                self.all_units.append(unit_obj)
-                alliance = unit.alliance
-                # Alliance.Neutral.value = 3
-                if alliance == 3:
-                    # XELNAGATOWER = 149
-                    if unit_type == 149:
-                        self.watchtowers.append(unit_obj)
-                    # mineral field enums
-                    elif unit_type in mineral_ids:
-                        self.mineral_field.append(unit_obj)
-                        self.resources.append(unit_obj)
-                    # geyser enums
-                    elif unit_type in geyser_ids:
-                        self.vespene_geyser.append(unit_obj)
-                        self.resources.append(unit_obj)
-                    # all destructable rocks
-                    else:
-                        self.destructables.append(unit_obj)
-                # Alliance.Self.value = 1
-                elif alliance == 1:
-                    unit_id = unit_obj.type_id
-                    if unit_obj.is_structure:
-                        self.structures.append(unit_obj)
-                        if unit_id in race_townhalls[self.race]:
-                            self.townhalls.append(unit_obj)
-                        elif unit_id in ALL_GAS or unit_obj.vespene_contents:
-                            # TODO: remove "or unit_obj.vespene_contents" when a new linux client newer than version 4.10.0 is released
-                            self.gas_buildings.append(unit_obj)
-                        elif unit_id in {
-                            UnitTypeId.TECHLAB,
-                            UnitTypeId.BARRACKSTECHLAB,
-                            UnitTypeId.FACTORYTECHLAB,
-                            UnitTypeId.STARPORTTECHLAB,
-                        }:
-                            self.techlab_tags.add(unit_obj.tag)
-                        elif unit_id in {
-                            UnitTypeId.REACTOR,
-                            UnitTypeId.BARRACKSREACTOR,
-                            UnitTypeId.FACTORYREACTOR,
-                            UnitTypeId.STARPORTREACTOR,
-                        }:
-                            self.reactor_tags.add(unit_obj.tag)
-                    else:
-                        self.units.append(unit_obj)
-                        # TODO add burrowed drones
-                        if unit_id == race_worker[self.race]:
-                            self.workers.append(unit_obj)
-                        elif unit_id == UnitTypeId.LARVA:
-                            self.larva.append(unit_obj)
-                # Alliance.Enemy.value = 4
-                elif alliance == 4:
-                    if unit_obj.is_structure:
-                        self.enemy_structures.append(unit_obj)
-                    else:
-                        self.enemy_units.append(unit_obj)
-
+        self.blips: Set[Blip] = self._frame_store.blips
+        self.state.effects |= self._frame_store.fake_effects
+        self.techlab_tags: Set[int] = self._frame_store.techlab_tags
+        self.reactor_tags: Set[int] = self._frame_store.reactor_tags
+        # Orders and build progress of the own units by ability, used by already_pending and similar functions
+        self._production_index: ProductionIndex = ProductionIndex(self._frame_store, self._game_data, self.race)
+
+        if self.distance_calculation_method == "auto":
+            self._select_distance_method()
         # Force distance calculation and caching on all units using scipy pdist or cdist
-        if self.distance_calculation_method == 1:
-            _ = self._unit_index_dict
-            _ = self._pdist
-        elif self.distance_calculation_method == 2:
-            _ = self._unit_index_dict
-            _ = self._cdist
-        elif self.distance_calculation_method == 3:
-            _ = self._unit_index_dict
-            _ = self._cdist
+        self._precalculate_distances()
 
     async def _after_step(self) -> int:
         """ Executed by main.py after each on_step function. """
@@ -1683,14 +1853,22 @@ class BotAI(DistanceCalculation):
         self._last_step_step_time = step_duration
         self._total_time_in_on_step += step_duration
         self._total_steps_iterations += 1
+        # In a batched frame exchange, main.py sends the actions and debug queries together with the step, see Client.exchange_frame
+        queue_requests = self._client.batched_frame_exchange and not self.realtime
         # Commit and clear bot actions
         if self.actions:
-            await self._do_actions(self.actions)
+            if queue_requests:
+                self._client._queue_actions(list(filter(self.prevent_double_actions, self.actions)))
+            else:
+                await self._do_actions(self.actions)
             self.actions.clear()
         # Clear set of unit tags that were given an order this frame by self.do()
         self.unit_tags_received_action.clear()
         # Commit debug queries
-        await self._client._send_debug()
+        if queue_requests:
+            self._client._queue_debug()
+        else:
+            await self._client._send_debug()
 
         return self.state.game_loop
 
@@ -1707,35 +1885,135 @@ class BotAI(DistanceCalculation):
         await self.issue_events()
         # await self.on_step(-1)
 
+    def _compile_event_pipeline(self):
+        """ Checks which event handlers the bot class overrides and selects the event issuers that have to run each step.
+        Events without an overridden handler are not issued, and issuers that only serve such events do not run at all. """
+        self._subscribed_events = {
+            handler_name
+            for handler_name in EVENT_HANDLERS + BATCHED_EVENT_HANDLERS
+            if self._handler_is_overridden(handler_name)
+        }
+        self._batched_events = {
+            handler_name: [] for handler_name in BATCHED_EVENT_HANDLERS if handler_name in self._subscribed_events
+        }
+        subscribed = self._subscribed_events
+        self._event_issuers = []
+        if subscribed & {"on_unit_destroyed", "on_units_destroyed"}:
+            self._event_issuers.append(self._issue_unit_dead_events)
+        # These always run because they count the created units for self.units_created
+        self._event_issuers.append(self._issue_unit_added_events)
+        self._event_issuers.append(self._issue_building_events)
+        if "on_upgrade_complete" in subscribed:
+            self._event_issuers.append(self._issue_upgrade_events)
+        if subscribed & {
+            "on_enemy_unit_entered_vision",
+            "on_enemy_unit_left_vision",
+            "on_enemy_units_entered_vision",
+            "on_enemy_units_left_vision",
+        }:
+            self._event_issuers.append(self._issue_vision_events)
+
+    def _handler_is_overridden(self, handler_name: str) -> bool:
+        """ Returns True if the bot class overrides the event handler 'handler_name' of BotAI, e.g. 'on_unit_took_damage'. """
+        return getattr(type(self), handler_name) is not getattr(BotAI, handler_name)
+
     async def issue_events(self):
         """ This function will be automatically run from main.py and triggers the following functions:
         - on_unit_created
         - on_unit_destroyed
+        - on_unit_type_changed
+        - on_unit_took_damage
         - on_building_construction_started
         - on_building_construction_complete
         - on_upgrade_complete
+        - on_enemy_unit_entered_vision
+        - on_enemy_unit_left_vision
+        and after these the batched handlers 'on_units_created', 'on_units_destroyed', 'on_units_type_changed',
+        'on_units_took_damage', 'on_enemy_units_entered_vision' and 'on_enemy_units_left_vision'.
+        Only the handlers that are overridden in the bot class are called.
         """
-        await self._issue_unit_dead_events()
-        await self._issue_unit_added_events()
-        await self._issue_building_events()
-        await self._issue_upgrade_events()
-        await self._issue_vision_events()
+        # Events that are left from a step in which a handler raised an error are not delivered again
+        for events in self._batched_events.values():
+            events.clear()
+        for event_issuer in self._event_issuers:
+            await event_issuer()
+        for handler_name in self._batched_events:
+            # Swap out the list before the handler is called, so the events are not kept if the handler raises an error
+            events, self._batched_events[handler_name] = self._batched_events[handler_name], []
+            if events:
+                await getattr(self, handler_name)(events)
+
+    def _damaged_and_type_changed(self, diff: GroupDiff) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Returns for the units that exist in both frames: a mask of the units that took damage,
+        the damage amounts and a mask of the units that changed their type.
+
+        :param diff: """
+        store, previous_store = self._frame_store, self._previous_frame_store
+        current, previous = diff.current, diff.previous
+        health = store.health[current].astype(np.float64)
+        shield = store.shield[current].astype(np.float64)
+        previous_health = previous_store.health[previous].astype(np.float64)
+        previous_shield = previous_store.shield[previous].astype(np.float64)
+        took_damage = (health < previous_health) | (shield < previous_shield)
+        damage_amounts = previous_health - health + previous_shield - shield
+        type_changed = store.type_id[current] != previous_store.type_id[previous]
+        return took_damage, damage_amounts, type_changed
+
+    def _collect_damage_and_type_events(self, diff: GroupDiff, events: list):
+        """ Adds the damage and type change events of the units that exist in both frames to 'events'
+        and to the batched events.
+
+        :param diff:
+        :param events: """
+        subscribed = self._subscribed_events
+        issue_damage = "on_unit_took_damage" in subscribed
+        batch_damage = "on_units_took_damage" in subscribed
+        issue_type_changed = "on_unit_type_changed" in subscribed
+        batch_type_changed = "on_units_type_changed" in subscribed
+        if not (issue_damage or batch_damage or issue_type_changed or batch_type_changed):
+            return
+        store = self._frame_store
+        took_damage, damage_amounts, type_changed = self._damaged_and_type_changed(diff)
+        if issue_damage or batch_damage:
+            # Check if a unit took damage this frame and then trigger event
+            for i in np.flatnonzero(took_damage).tolist():
+                index = int(diff.current[i])
+                unit, amount = store.unit(index), float(damage_amounts[i])
+                if issue_damage:
+                    events.append((index, 1, self.on_unit_took_damage, (unit, amount)))
+                if batch_damage:
+                    self._batched_events["on_units_took_damage"].append((unit, amount))
+        if issue_type_changed or batch_type_changed:
+            # Check if a unit type has changed
+            for i in np.flatnonzero(type_changed).tolist():
+                index = int(diff.current[i])
+                unit = store.unit(index)
+                previous_type = UnitTypeId(int(self._previous_frame_store.type_id[diff.previous[i]]))
+                if issue_type_changed:
+                    events.append((index, 2, self.on_unit_type_changed, (unit, previous_type)))
+                if batch_type_changed:
+                    self._batched_events["on_units_type_changed"].append((unit, previous_type))
 
     async def _issue_unit_added_events(self):
-        for unit in self.units:
-            if unit.tag not in self._units_previous_map and unit.tag not in self._unit_tags_seen_this_game:
+        store = self._frame_store
+        diff = store.diff_group(self._previous_frame_store, GROUP_UNITS)
+        # Events as (index in the current frame, event order, handler, arguments), issued in the order of self.units
+        events = []
+        issue_unit_created = "on_unit_created" in self._subscribed_events
+        batch_unit_created = "on_units_created" in self._subscribed_events
+        for index in diff.new.tolist():
+            unit = store.unit(index)
+            if unit.tag not in self._unit_tags_seen_this_game:
                 self._unit_tags_seen_this_game.add(unit.tag)
                 self._units_created[unit.type_id] += 1
-                await self.on_unit_created(unit)
-            elif unit.tag in self._units_previous_map:
-                previous_frame_unit: Unit = self._units_previous_map[unit.tag]
-                # Check if a unit took damage this frame and then trigger event
-                if unit.health < previous_frame_unit.health or unit.shield < previous_frame_unit.shield:
-                    damage_amount = previous_frame_unit.health - unit.health + previous_frame_unit.shield - unit.shield
-                    await self.on_unit_took_damage(unit, damage_amount)
-                # Check if a unit type has changed
-                if previous_frame_unit.type_id != unit.type_id:
-                    await self.on_unit_type_changed(unit, previous_frame_unit.type_id)
+                if issue_unit_created:
+                    events.append((index, 0, self.on_unit_created, (unit,)))
+                if batch_unit_created:
+                    self._batched_events["on_units_created"].append(unit)
+        self._collect_damage_and_type_events(diff, events)
+        events.sort(key=lambda event: event[:2])
+        for _index, _order, handler, arguments in events:
+            await handler(*arguments)
 
     async def _issue_upgrade_events(self):
         difference = self.state.upgrades - self._previous_upgrades
@@ -1744,60 +2022,61 @@ class BotAI(DistanceCalculation):
         self._previous_upgrades = self.state.upgrades
 
     async def _issue_building_events(self):
-        for structure in self.structures:
-            if structure.tag not in self._structures_previous_map:
-                if structure.build_progress < 1:
-                    await self.on_building_construction_started(structure)
-                else:
-                    # Include starting townhall
-                    self._units_created[structure.type_id] += 1
-                    await self.on_building_construction_complete(structure)
-            elif structure.tag in self._structures_previous_map:
-                # Check if a structure took damage this frame and then trigger event
-                previous_frame_structure: Unit = self._structures_previous_map[structure.tag]
-                if (
-                    structure.health < previous_frame_structure.health
-                    or structure.shield < previous_frame_structure.shield
-                ):
-                    damage_amount = (
-                        previous_frame_structure.health
-                        - structure.health
-                        + previous_frame_structure.shield
-                        - structure.shield
-                    )
-                    await self.on_unit_took_damage(structure, damage_amount)
-                # Check if a structure changed its type
-                if previous_frame_structure.type_id != structure.type_id:
-                    await self.on_unit_type_changed(structure, previous_frame_structure.type_id)
-                # Check if structure completed
-                if structure.build_progress == 1 and previous_frame_structure.build_progress < 1:
-                    self._units_created[structure.type_id] += 1
-                    await self.on_building_construction_complete(structure)
+        store, previous_store = self._frame_store, self._previous_frame_store
+        diff = store.diff_group(previous_store, GROUP_STRUCTURES)
+        # Events as (index in the current frame, event order, handler, arguments), issued in the order of self.structures
+        events = []
+        issue_construction_started = "on_building_construction_started" in self._subscribed_events
+        issue_construction_complete = "on_building_construction_complete" in self._subscribed_events
+        for index in diff.new.tolist():
+            structure = store.unit(index)
+            if structure.build_progress < 1:
+                if issue_construction_started:
+                    events.append((index, 0, self.on_building_construction_started, (structure,)))
+            else:
+                # Include starting townhall
+                self._units_created[structure.type_id] += 1
+                if issue_construction_complete:
+                    events.append((index, 0, self.on_building_construction_complete, (structure,)))
+        self._collect_damage_and_type_events(diff, events)
+        # Check if structure completed
+        completed = (store.build_progress[diff.current] == 1) & (previous_store.build_progress[diff.previous] < 1)
+        for index in diff.current[completed].tolist():
+            structure = store.unit(index)
+            self._units_created[structure.type_id] += 1
+            if issue_construction_complete:
+                events.append((index, 3, self.on_building_construction_complete, (structure,)))
+        events.sort(key=lambda event: event[:2])
+        for _index, _order, handler, arguments in events:
+            await handler(*arguments)
 
     async def _issue_vision_events(self):
+        store, previous_store = self._frame_store, self._previous_frame_store
+        subscribed = self._subscribed_events
+        enemy_units_diff = store.diff_group(previous_store, GROUP_ENEMY_UNITS)
+        enemy_structures_diff = store.diff_group(previous_store, GROUP_ENEMY_STRUCTURES)
         # Call events for enemy unit entered vision
-        for enemy_unit in self.enemy_units:
-            if enemy_unit.tag not in self._enemy_units_previous_map:
-                await self.on_enemy_unit_entered_vision(enemy_unit)
-        for enemy_structure in self.enemy_structures:
-            if enemy_structure.tag not in self._enemy_structures_previous_map:
-                await self.on_enemy_unit_entered_vision(enemy_structure)
-
+        entered_vision = itertools.chain(enemy_units_diff.new.tolist(), enemy_structures_diff.new.tolist())
+        if "on_enemy_units_entered_vision" in subscribed:
+            entered_vision = list(entered_vision)
+            self._batched_events["on_enemy_units_entered_vision"].extend(store.unit(index) for index in entered_vision)
+        if "on_enemy_unit_entered_vision" in subscribed:
+            for index in entered_vision:
+                await self.on_enemy_unit_entered_vision(store.unit(index))
         # Call events for enemy unit left vision
-        if self.enemy_units:
-            visible_enemy_units = self.enemy_units.tags
-            for enemy_unit_tag in self._enemy_units_previous_map.keys():
-                if enemy_unit_tag not in visible_enemy_units:
-                    await self.on_enemy_unit_left_vision(enemy_unit_tag)
-        if self.enemy_structures:
-            visible_enemy_structures = self.enemy_structures.tags
-            for enemy_structure_tag in self._enemy_units_previous_map.keys():
-                if enemy_structure_tag not in visible_enemy_structures:
-                    await self.on_enemy_unit_left_vision(enemy_structure_tag)
+        left_vision = previous_store.tag[np.concatenate((enemy_units_diff.gone, enemy_structures_diff.gone))].tolist()
+        if "on_enemy_units_left_vision" in subscribed:
+            self._batched_events["on_enemy_units_left_vision"].extend(left_vision)
+        if "on_enemy_unit_left_vision" in subscribed:
+            for unit_tag in left_vision:
+                await self.on_enemy_unit_left_vision(unit_tag)
 
     async def _issue_unit_dead_events(self):
-        for unit_tag in self.state.dead_units:
-            await self.on_unit_destroyed(unit_tag)
+        if "on_units_destroyed" in self._subscribed_events:
+            self._batched_events["on_units_destroyed"].extend(self.state.dead_units)
+        if "on_unit_destroyed" in self._subscribed_events:
+            for unit_tag in self.state.dead_units:
+                await self.on_unit_destroyed(unit_tag)
 
     async def on_unit_destroyed(self, unit_tag: int):
         """
@@ -1887,6 +2166,44 @@ class BotAI(DistanceCalculation):
         :param unit_tag:
         """
 
+    async def on_units_created(self, units: List[Unit]):
+        """ Override this in your bot class. Batched variant of 'on_unit_created':
+        called once per step with all units that were created this step, instead of once per unit.
+
+        :param units: """
+
+    async def on_units_destroyed(self, unit_tags: List[int]):
+        """ Override this in your bot class. Batched variant of 'on_unit_destroyed', called once per step with the tags of all destroyed units.
+
+        :param unit_tags: """
+
+    async def on_units_type_changed(self, units_and_previous_types: List[Tuple[Unit, UnitTypeId]]):
+        """ Override this in your bot class. Batched variant of 'on_unit_type_changed',
+        called once per step with a list of (unit, previous type) of all units that changed their type this step.
+
+        :param units_and_previous_types: """
+
+    async def on_units_took_damage(self, units_and_damage_taken: List[Tuple[Unit, float]]):
+        """ Override this in your bot class. Batched variant of 'on_unit_took_damage',
+        called once per step with a list of (unit, amount of damage taken) of all own units and structures that took damage this step.
+
+        Examples::
+
+            for unit, amount_damage_taken in units_and_damage_taken:
+                print(f"{unit} took {amount_damage_taken} damage")
+
+        :param units_and_damage_taken: """
+
+    async def on_enemy_units_entered_vision(self, units: List[Unit]):
+        """ Override this in your bot class. Batched variant of 'on_enemy_unit_entered_vision', called once per step with all enemy units that entered vision.
+
+        :param units: """
+
+    async def on_enemy_units_left_vision(self, unit_tags: List[int]):
+        """ Override this in your bot class. Batched variant of 'on_enemy_unit_left_vision', called once per step with the tags of all enemy units that left vision.
+
+        :param unit_tags: """
+
     async def on_before_start(self):
         """
         Override this in your bot class. This function is called before "on_start"
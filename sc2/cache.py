@@ -64,13 +64,17 @@ def property_cache_once_per_frame_no_copy(f):
 
 
 def property_immutable_cache(f):
-    """ This cache should only be used on properties that return an immutable object (bool, str, int, float, tuple, Unit, Point2, Point3) """
+    """ This cache should only be used on properties that return an immutable object (bool, str, int, float, tuple, Unit, Point2, Point3)
+    If 'self.cache' is None, the cache dict is created on first access """
 
     @wraps(f)
     def inner(self):
-        if f.__name__ not in self.cache:
-            self.cache[f.__name__] = f(self)
-        return self.cache[f.__name__]
+        cache = self.cache
+        if cache is None:
+            cache = self.cache = {}
+        if f.__name__ not in cache:
+            cache[f.__name__] = f(self)
+        return cache[f.__name__]
 
     return property(inner)
 
@@ -80,8 +84,11 @@ def property_mutable_cache(f):
 
     @wraps(f)
     def inner(self):
-        if f.__name__ not in self.cache:
-            self.cache[f.__name__] = f(self)
-        return self.cache[f.__name__].copy()
+        cache = self.cache
+        if cache is None:
+            cache = self.cache = {}
+        if f.__name__ not in cache:
+            cache[f.__name__] = f(self)
+        return cache[f.__name__].copy()
 
     return property(inner)
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import logging
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 
@@ -22,6 +23,9 @@ from .units import Units
 
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from .unit_command import UnitCommand
+
 
 class Client(Protocol):
     def __init__(self, ws):
@@ -43,6 +47,14 @@ class Client(Protocol):
 
         self._renderer = None
         self.raw_affects_selection = False
+        # If True, the actions and debug draws of a step are not sent by BotAI._after_step, but queued and sent by main.py
+        # together with the step, observation and game info requests in one frame exchange, see 'exchange_frame'
+        self.batched_frame_exchange = False
+        # Requests queued for the next frame exchange, as keyword arguments of sc_pb.Request
+        self._frame_requests: List[Dict[str, Any]] = []
+        # Placement and pathing queries that are sent together in one query request, see '_queue_query'
+        self._queued_queries: List[Tuple[str, bool, list, asyncio.Future]] = []
+        self._query_task: Optional[asyncio.Task] = None
 
     @property
     def in_game(self):
@@ -125,6 +137,10 @@ class Client(Protocol):
             result = await self._execute(observation=sc_pb.RequestObservation(game_loop=game_loop))
         else:
             result = await self._execute(observation=sc_pb.RequestObservation())
+        return await self._handle_observation(result)
+
+    async def _handle_observation(self, result):
+        """ Stores the game result if the game ended and renders the observation if rendering was requested. """
         assert result.HasField("observation")
 
         if not self.in_game or result.observation.player_result:
@@ -149,6 +165,70 @@ class Client(Protocol):
         step_size = step_size or self.game_step
         return await self._execute(step=sc_pb.RequestStep(count=step_size))
 
+    async def _execute(self, **kwargs):
+        if self._frame_requests:
+            # Requests queued for the frame exchange were issued before this one, so they are sent first
+            await self._send_frame_requests()
+        if self._queued_queries:
+            await self._send_queued_queries()
+        return await super()._execute(**kwargs)
+
+    def _queue_frame_request(self, **kwargs):
+        """ Queues a request to be sent with the next frame exchange. """
+        self._frame_requests.append(kwargs)
+
+    async def _send_frame_requests(self) -> List[ActionResult]:
+        """ Sends all queued frame requests back-to-back and receives their responses.
+        Returns the results of the queued actions that did not succeed, see '_receive_frame_responses'. """
+        requests, self._frame_requests = self._frame_requests, []
+        futures = [await self._send(**request) for request in requests]
+        return await self._receive_frame_responses(futures)
+
+    async def _receive_frame_responses(self, futures: List[asyncio.Future]) -> List[ActionResult]:
+        """ Receives the responses of queued frame requests.
+        Like 'actions()', returns the results of the actions that did not succeed, they are also logged. """
+        action_errors: List[ActionResult] = []
+        for future in futures:
+            response = await self._receive(future)
+            if response.HasField("action"):
+                action_errors.extend(
+                    ActionResult(r) for r in response.action.result if ActionResult(r) != ActionResult.Success
+                )
+        if action_errors:
+            logger.warning(f"Actions of the frame exchange were not executed: {action_errors}")
+        return action_errors
+
+    async def exchange_frame(self, step_size: int = None, game_info: bool = False):
+        """ Sends the queued requests of this step (actions and debug draws), the step request, the observation request
+        and if 'game_info' is True the game info request back-to-back without waiting for each response, then receives all responses.
+        The step then takes one round trip instead of one per request.
+        Returns the observation response, the game info response (None if it was not requested or the game has ended)
+        and the results of the queued actions that did not succeed.
+        main.py requests the game info if 'BotAI._should_refresh_game_info' returns True for the state before the step,
+        then no separate game info request is sent after the exchange.
+
+        :param step_size:
+        :param game_info: """
+        step_size = step_size or self.game_step
+        requests, self._frame_requests = self._frame_requests, []
+        requests.append({"step": sc_pb.RequestStep(count=step_size)})
+        requests.append({"observation": sc_pb.RequestObservation()})
+        if game_info:
+            requests.append({"game_info": sc_pb.RequestGameInfo()})
+        futures = [await self._send(**request) for request in requests]
+        action_errors = await self._receive_frame_responses(futures[: -2 if game_info else -1])
+        observation_future = futures[-2] if game_info else futures[-1]
+        observation = await self._handle_observation(await self._receive(observation_future))
+        game_info_response = None
+        if game_info:
+            try:
+                game_info_response = await self._receive(futures[-1])
+            except ProtocolError as e:
+                # The game ended with this step, the game result was stored by the observation
+                if not e.is_game_over_error:
+                    raise
+        return observation, game_info_response, action_errors
+
     async def get_game_data(self) -> GameData:
         result = await self._execute(
             data=sc_pb.RequestData(ability_id=True, unit_type_id=True, upgrade_id=True, buff_id=True, effect_id=True)
@@ -184,44 +264,90 @@ class Client(Protocol):
             return None
         elif not isinstance(actions, list):
             actions = [actions]
-        res = await self._execute(
-            action=sc_pb.RequestAction(actions=(sc_pb.Action(action_raw=a) for a in combine_actions(actions)))
-        )
+        res = await self._execute(action=self._action_request(actions))
         if return_successes:
             return [ActionResult(r) for r in res.action.result]
         else:
             return [ActionResult(r) for r in res.action.result if ActionResult(r) != ActionResult.Success]
 
+    @staticmethod
+    def _action_request(actions: List[UnitCommand]) -> sc_pb.RequestAction:
+        return sc_pb.RequestAction(actions=(sc_pb.Action(action_raw=a) for a in combine_actions(actions)))
+
+    def _queue_actions(self, actions: List[UnitCommand]):
+        """ Queues the actions to be sent with the next frame exchange, their results are not checked. """
+        if actions:
+            self._queue_frame_request(action=self._action_request(actions))
+
+    def _queue_query(self, kind: str, entries: list, ignore_resources: bool = True) -> asyncio.Future:
+        """ Queues placement or pathing entries for the next query request and returns a future of their results.
+        All queries that are queued before the event loop runs again, e.g. by coroutines started together with 'asyncio.gather',
+        are sent in one query request and their futures complete together.
+
+        :param kind: "placements" or "pathing", the field of the query request
+        :param entries: RequestQueryBuildingPlacement or RequestQueryPathing entries
+        :param ignore_resources: """
+        future = asyncio.get_event_loop().create_future()
+        self._queued_queries.append((kind, ignore_resources, entries, future))
+        if self._query_task is None or self._query_task.done():
+            self._query_task = asyncio.ensure_future(self._send_queued_queries())
+        return future
+
+    async def _send_queued_queries(self):
+        """ Sends all queued queries and sets the results of their futures.
+        Placements that ignore the resource requirements and placements that check them need separate query requests,
+        which are then sent back-to-back. The pathing entries are added to the first of them. """
+        queries, self._queued_queries = self._queued_queries, []
+        if not queries:
+            return
+        requests: Dict[bool, query_pb.RequestQuery] = {}
+        for kind, ignore_resources, _, _ in queries:
+            if kind == "placements" and ignore_resources not in requests:
+                requests[ignore_resources] = query_pb.RequestQuery(ignore_resource_requirements=ignore_resources)
+        if not requests:
+            requests[True] = query_pb.RequestQuery(ignore_resource_requirements=True)
+        pathing_request_key = next(iter(requests))
+        # Per query the request it was added to and its slice of the results
+        result_slices: List[Tuple[bool, str, int, int, asyncio.Future]] = []
+        for kind, ignore_resources, entries, future in queries:
+            request_key = ignore_resources if kind == "placements" else pathing_request_key
+            request_entries = getattr(requests[request_key], kind)
+            start = len(request_entries)
+            request_entries.extend(entries)
+            result_slices.append((request_key, kind, start, len(request_entries), future))
+        try:
+            if self._frame_requests:
+                await self._send_frame_requests()
+            futures = {key: await self._send(query=request) for key, request in requests.items()}
+            responses = {key: (await self._receive(future)).query for key, future in futures.items()}
+        except Exception as e:
+            for *_, future in queries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for request_key, kind, start, end, future in result_slices:
+            if not future.done():
+                future.set_result(list(getattr(responses[request_key], kind)[start:end]))
+
     async def query_pathing(
         self, start: Union[Unit, Point2, Point3], end: Union[Point2, Point3]
     ) -> Optional[Union[int, float]]:
         """ Caution: returns "None" when path not found
         Try to combine queries with the function below because the pathing query is generally slow.
+        Pathing queries of coroutines that run at the same time, e.g. with 'asyncio.gather', are sent in one query request.
 
         :param start:
         :param end: """
         assert isinstance(start, (Point2, Unit))
         assert isinstance(end, Point2)
         if isinstance(start, Point2):
-            result = await self._execute(
-                query=query_pb.RequestQuery(
-                    pathing=[
-                        query_pb.RequestQueryPathing(
-                            start_pos=common_pb.Point2D(x=start.x, y=start.y),
-                            end_pos=common_pb.Point2D(x=end.x, y=end.y),
-                        )
-                    ]
-                )
+            entry = query_pb.RequestQueryPathing(
+                start_pos=common_pb.Point2D(x=start.x, y=start.y), end_pos=common_pb.Point2D(x=end.x, y=end.y)
             )
         else:
-            result = await self._execute(
-                query=query_pb.RequestQuery(
-                    pathing=[
-                        query_pb.RequestQueryPathing(unit_tag=start.tag, end_pos=common_pb.Point2D(x=end.x, y=end.y))
-                    ]
-                )
-            )
-        distance = float(result.query.pathing[0].distance)
+            entry = query_pb.RequestQueryPathing(unit_tag=start.tag, end_pos=common_pb.Point2D(x=end.x, y=end.y))
+        result = await self._queue_query("pathing", [entry])
+        distance = float(result[0].distance)
         if distance <= 0.0:
             return None
         return distance
@@ -240,43 +366,37 @@ class Client(Protocol):
         assert isinstance(zipped_list[0][0], (Point2, Unit)), f"{type(zipped_list[0][0])}"
         assert isinstance(zipped_list[0][1], Point2), f"{type(zipped_list[0][1])}"
         if isinstance(zipped_list[0][0], Point2):
-            results = await self._execute(
-                query=query_pb.RequestQuery(
-                    pathing=(
-                        query_pb.RequestQueryPathing(
-                            start_pos=common_pb.Point2D(x=p1.x, y=p1.y), end_pos=common_pb.Point2D(x=p2.x, y=p2.y)
-                        )
-                        for p1, p2 in zipped_list
-                    )
+            entries = [
+                query_pb.RequestQueryPathing(
+                    start_pos=common_pb.Point2D(x=p1.x, y=p1.y), end_pos=common_pb.Point2D(x=p2.x, y=p2.y)
                 )
-            )
+                for p1, p2 in zipped_list
+            ]
         else:
-            results = await self._execute(
-                query=query_pb.RequestQuery(
-                    pathing=(
-                        query_pb.RequestQueryPathing(unit_tag=p1.tag, end_pos=common_pb.Point2D(x=p2.x, y=p2.y))
-                        for p1, p2 in zipped_list
-                    )
-                )
-            )
-        return [float(d.distance) for d in results.query.pathing]
+            entries = [
+                query_pb.RequestQueryPathing(unit_tag=p1.tag, end_pos=common_pb.Point2D(x=p2.x, y=p2.y))
+                for p1, p2 in zipped_list
+            ]
+        results = await self._queue_query("pathing", entries)
+        return [float(d.distance) for d in results]
 
     async def query_building_placement(
         self, ability: AbilityData, positions: List[Union[Point2, Point3]], ignore_resources: bool = True
     ) -> List[ActionResult]:
+        """ Placement queries of coroutines that run at the same time, e.g. with 'asyncio.gather', are sent in one query request.
+
+        :param ability:
+        :param positions:
+        :param ignore_resources: """
         assert isinstance(ability, AbilityData)
-        result = await self._execute(
-            query=query_pb.RequestQuery(
-                placements=(
-                    query_pb.RequestQueryBuildingPlacement(
-                        ability_id=ability.id.value, target_pos=common_pb.Point2D(x=position.x, y=position.y)
-                    )
-                    for position in positions
-                ),
-                ignore_resource_requirements=ignore_resources,
+        entries = [
+            query_pb.RequestQueryBuildingPlacement(
+                ability_id=ability.id.value, target_pos=common_pb.Point2D(x=position.x, y=position.y)
             )
-        )
-        return [ActionResult(p.result) for p in result.query.placements]
+            for position in positions
+        ]
+        results = await self._queue_query("placements", entries, ignore_resources)
+        return [ActionResult(p.result) for p in results]
 
     async def query_available_abilities(
         self, units: Union[List[Unit], Units], ignore_resource_requirements: bool = False
@@ -516,33 +636,43 @@ class Client(Protocol):
         """ Sends the debug draw execution. This is run by main.py now automatically, if there is any items in the list. You do not need to run this manually any longer.
         Check examples/terran/ramp_wall.py for example drawing. Each draw request needs to be sent again in every single on_step iteration.
         """
+        debug_request = self._debug_request()
+        if debug_request is not None:
+            await self._execute(debug=debug_request)
+
+    def _queue_debug(self):
+        """ Queues the debug draw request to be sent with the next frame exchange. """
+        debug_request = self._debug_request()
+        if debug_request is not None:
+            self._queue_frame_request(debug=debug_request)
+
+    def _debug_request(self) -> Optional[sc_pb.RequestDebug]:
+        """ Returns the debug draw request of this step and clears the drawn items.
+        Returns None if nothing has to be sent because the drawings did not change since the last step. """
         debug_hash = (
             sum(hash(item) for item in self._debug_texts),
             sum(hash(item) for item in self._debug_lines),
             sum(hash(item) for item in self._debug_boxes),
             sum(hash(item) for item in self._debug_spheres),
         )
+        debug_request = None
         if debug_hash != (0, 0, 0, 0):
             if debug_hash != self._debug_hash_tuple_last_iteration:
                 # Something has changed, either more or less is to be drawn, or a position of a drawing changed (e.g. when drawing on a moving unit)
                 self._debug_hash_tuple_last_iteration = debug_hash
-                await self._execute(
-                    debug=sc_pb.RequestDebug(
-                        debug=[
-                            debug_pb.DebugCommand(
-                                draw=debug_pb.DebugDraw(
-                                    text=[text.to_proto() for text in self._debug_texts] if self._debug_texts else None,
-                                    lines=[line.to_proto() for line in self._debug_lines]
-                                    if self._debug_lines
-                                    else None,
-                                    boxes=[box.to_proto() for box in self._debug_boxes] if self._debug_boxes else None,
-                                    spheres=[sphere.to_proto() for sphere in self._debug_spheres]
-                                    if self._debug_spheres
-                                    else None,
-                                )
+                debug_request = sc_pb.RequestDebug(
+                    debug=[
+                        debug_pb.DebugCommand(
+                            draw=debug_pb.DebugDraw(
+                                text=[text.to_proto() for text in self._debug_texts] if self._debug_texts else None,
+                                lines=[line.to_proto() for line in self._debug_lines] if self._debug_lines else None,
+                                boxes=[box.to_proto() for box in self._debug_boxes] if self._debug_boxes else None,
+                                spheres=[sphere.to_proto() for sphere in self._debug_spheres]
+                                if self._debug_spheres
+                                else None,
                             )
-                        ]
-                    )
+                        )
+                    ]
                 )
             self._debug_draw_last_frame = True
             self._debug_texts.clear()
@@ -552,14 +682,11 @@ class Client(Protocol):
         elif self._debug_draw_last_frame:
             # Clear drawing if we drew last frame but nothing to draw this frame
             self._debug_hash_tuple_last_iteration = (0, 0, 0, 0)
-            await self._execute(
-                debug=sc_pb.RequestDebug(
-                    debug=[
-                        debug_pb.DebugCommand(draw=debug_pb.DebugDraw(text=None, lines=None, boxes=None, spheres=None))
-                    ]
-                )
+            debug_request = sc_pb.RequestDebug(
+                debug=[debug_pb.DebugCommand(draw=debug_pb.DebugDraw(text=None, lines=None, boxes=None, spheres=None))]
             )
             self._debug_draw_last_frame = False
+        return debug_request
 
     async def debug_leave(self):
         await self._execute(debug=sc_pb.RequestDebug(debug=[debug_pb.DebugCommand(end_game=debug_pb.DebugEndGame())]))
@@ -3,16 +3,19 @@ from sc2.unit import Unit
 from sc2.units import Units
 from sc2.game_state import GameState
 
+from s2clientprotocol import common_pb2 as common_pb, raw_pb2 as raw_pb
+
 import logging
 
 logger = logging.getLogger(__name__)
 
 from scipy.spatial.distance import pdist, cdist
 import math
+import time
 from math import pow
 import numpy as np
 
-from typing import Dict, Tuple, Iterable, Generator
+from typing import Dict, List, Tuple, Iterable, Generator
 
 
 class DistanceCalculation:
@@ -25,10 +28,28 @@ class DistanceCalculation:
         # Pdist condensed vector generated by scipy pdist, half the size of the cdist matrix as 1d array
         self._cached_pdist: np.ndarray = None
         self._cached_cdist: np.ndarray = None
+        # Method 4: squared distance matrix over unit slots that persist over frames, entries are NaN until they are requested
+        self._lazy_frame = -100
+        self._lazy_matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        # Position of the unit in each slot at the time its distances were calculated
+        self._lazy_positions: np.ndarray = np.empty((0, 2), dtype=np.float32)
+        self._lazy_slot_of_tag: Dict[int, int] = {}
+        self._lazy_free_slots: List[int] = []
+        # Slot of each unit of the current frame, indexed like 'self.all_units'
+        self._lazy_slots: np.ndarray = None
+        self._lazy_slots_list: List[int] = None
+        self._lazy_positions_list: List[List[float]] = None
+        # Method that is currently used, differs from 'distance_calculation_method' if that is set to "auto"
+        self._distance_method_in_use: int = 0
+        # Used by the "auto" method: calibration results of 'benchmark_distance_methods' and how many distances the bot requests per frame
+        self._distance_benchmark: Dict[int, Dict[int, Tuple[float, float]]] = None
+        self._distance_queries_this_frame: int = 0
+        self._distance_queries_per_frame: float = 0
+        self._distance_squared_unit_to_unit_in_use = None
 
     @property
     def _units_count(self) -> int:
-        return len(self.all_units)
+        return len(self._frame_store)
 
     @property
     def _unit_index_dict(self) -> Dict[int, int]:
@@ -53,18 +74,14 @@ class DistanceCalculation:
 
     def generate_unit_indices(self) -> Dict[int, int]:
         if self._generated_frame != self.state.game_loop:
-            self._cached_unit_index_dict = {unit.tag: index for index, unit in enumerate(self.all_units)}
+            self._cached_unit_index_dict = dict(zip(self._frame_store.tag.tolist(), range(self._units_count)))
             self._generated_frame = self.state.game_loop
         return self._cached_unit_index_dict
 
     def _calculate_distances_method1(self) -> np.ndarray:
         if self._generated_frame2 != self.state.game_loop:
-            # Converts tuple [(1, 2), (3, 4)] to flat list like [1, 2, 3, 4]
-            flat_positions = (coord for unit in self.all_units for coord in unit.position_tuple)
-            # Converts to numpy array, then converts the flat array back to shape (n, 2): [[1, 2], [3, 4]]
-            positions_array: np.ndarray = np.fromiter(
-                flat_positions, dtype=np.float, count=2 * self._units_count
-            ).reshape((self._units_count, 2))
+            # Positions of all units as array of shape (n, 2): [[1, 2], [3, 4]], taken from the columns of the frame store
+            positions_array: np.ndarray = self._frame_store.positions
             assert len(positions_array) == self._units_count
             self._generated_frame2 = self.state.game_loop
             # See performance benchmarks
@@ -95,12 +112,8 @@ class DistanceCalculation:
 
     def _calculate_distances_method2(self) -> np.ndarray:
         if self._generated_frame2 != self.state.game_loop:
-            # Converts tuple [(1, 2), (3, 4)] to flat list like [1, 2, 3, 4]
-            flat_positions = (coord for unit in self.all_units for coord in unit.position_tuple)
-            # Converts to numpy array, then converts the flat array back to shape (n, 2): [[1, 2], [3, 4]]
-            positions_array: np.ndarray = np.fromiter(
-                flat_positions, dtype=np.float, count=2 * self._units_count
-            ).reshape((self._units_count, 2))
+            # Positions of all units as array of shape (n, 2): [[1, 2], [3, 4]], taken from the columns of the frame store
+            positions_array: np.ndarray = self._frame_store.positions
             assert len(positions_array) == self._units_count
             self._generated_frame2 = self.state.game_loop
             # See performance benchmarks
@@ -111,16 +124,81 @@ class DistanceCalculation:
     def _calculate_distances_method3(self) -> np.ndarray:
         """ Nearly same as above, but without asserts"""
         if self._generated_frame2 != self.state.game_loop:
-            flat_positions = (coord for unit in self.all_units for coord in unit.position_tuple)
-            positions_array: np.ndarray = np.fromiter(
-                flat_positions, dtype=np.float, count=2 * self._units_count
-            ).reshape((-1, 2))
+            positions_array: np.ndarray = self._frame_store.positions
             self._generated_frame2 = self.state.game_loop
             # See performance benchmarks
             self._cached_cdist = cdist(positions_array, positions_array, "sqeuclidean")
 
         return self._cached_cdist
 
+    def _update_lazy_distances(self):
+        """ Assigns a slot in the lazy distance matrix to each unit of the current frame.
+        Slots whose unit is new or has moved since the distances were calculated get their row and column cleared,
+        all other distances are kept from the previous frames. """
+        if self._lazy_frame == self.state.game_loop:
+            return
+        self._lazy_frame = self.state.game_loop
+        positions = self._frame_store.positions
+        previous_slot_of_tag = self._lazy_slot_of_tag
+        slot_of_tag: Dict[int, int] = {}
+        slots: List[int] = []
+        new_units: List[int] = []
+        for index, tag in enumerate(self._frame_store.tag.tolist()):
+            slot = previous_slot_of_tag.pop(tag, None)
+            if slot is None:
+                new_units.append(index)
+                slot = -1
+            else:
+                slot_of_tag[tag] = slot
+            slots.append(slot)
+        # The remaining slots belong to units that died or left vision
+        self._lazy_free_slots.extend(previous_slot_of_tag.values())
+
+        if len(new_units) > len(self._lazy_free_slots):
+            # Grow the matrix, the new slots are free
+            capacity = len(self._lazy_matrix)
+            new_capacity = max(2 * capacity, capacity + len(new_units) - len(self._lazy_free_slots), 64)
+            matrix = np.full((new_capacity, new_capacity), np.nan, dtype=np.float32)
+            matrix[:capacity, :capacity] = self._lazy_matrix
+            self._lazy_matrix = matrix
+            self._lazy_positions = np.concatenate(
+                (self._lazy_positions, np.zeros((new_capacity - capacity, 2), dtype=np.float32))
+            )
+            self._lazy_free_slots.extend(range(capacity, new_capacity))
+        for index in new_units:
+            slot = self._lazy_free_slots.pop()
+            slot_of_tag[self._frame_store.tag.item(index)] = slot
+            slots[index] = slot
+
+        slots_array = np.array(slots, dtype=np.intp)
+        moved = np.any(self._lazy_positions[slots_array] != positions, axis=1)
+        moved_slots = slots_array[moved]
+        if len(moved_slots):
+            self._lazy_matrix[moved_slots, :] = np.nan
+            self._lazy_matrix[:, moved_slots] = np.nan
+            self._lazy_positions[moved_slots] = positions[moved]
+        self._lazy_slot_of_tag = slot_of_tag
+        self._lazy_slots = slots_array
+        self._lazy_slots_list = slots
+        self._lazy_positions_list = positions.tolist()
+
+    def _lazy_distances_block(self, indices1: np.ndarray, indices2: np.ndarray) -> np.ndarray:
+        """ Returns the squared distances between the units at 'indices1' and the units at 'indices2' (indices of 'self.all_units') as matrix of shape (len(indices1), len(indices2)).
+        Only the distances of this block that are not known yet are calculated. """
+        self._update_lazy_distances()
+        slots1 = self._lazy_slots[indices1]
+        slots2 = self._lazy_slots[indices2]
+        block = self._lazy_matrix[np.ix_(slots1, slots2)]
+        missing = np.isnan(block)
+        if missing.any():
+            rows = missing.any(axis=1)
+            columns = missing.any(axis=0)
+            calculated = cdist(self._lazy_positions[slots1[rows]], self._lazy_positions[slots2[columns]], "sqeuclidean")
+            self._lazy_matrix[np.ix_(slots1[rows], slots2[columns])] = calculated
+            self._lazy_matrix[np.ix_(slots2[columns], slots1[rows])] = calculated.T
+            block[np.ix_(rows, columns)] = calculated
+        return block
+
     def _get_index_of_two_units_method1(self, unit1: Unit, unit2: Unit) -> int:
         assert (
             unit1.tag in self._unit_index_dict
@@ -191,6 +269,35 @@ class DistanceCalculation:
         # return distance
         return self._cdist[self._get_index_of_two_units(unit1, unit2)]
 
+    def _distance_squared_unit_to_unit_method4(self, unit1: Unit, unit2: Unit) -> float:
+        # Calculate only the requested distance if it is not known from this or a previous frame
+        self._update_lazy_distances()
+        index1, index2 = self._get_index_of_two_units(unit1, unit2)
+        slot1 = self._lazy_slots_list[index1]
+        slot2 = self._lazy_slots_list[index2]
+        matrix = self._lazy_matrix
+        distance = matrix[slot1, slot2]
+        if distance != distance:
+            # Distance is NaN and has not been calculated yet
+            distance = self.distance_math_hypot_squared(
+                self._lazy_positions_list[index1], self._lazy_positions_list[index2]
+            )
+            matrix[slot1, slot2] = distance
+            matrix[slot2, slot1] = distance
+        return distance
+
+    def _distances_squared_units_to_units(self, units1: Units, units2: Units) -> np.ndarray:
+        """ Returns the squared distances between all units of 'units1' and all units of 'units2' as matrix of shape (len(units1), len(units2)).
+        Uses the distance matrix of the current frame if the method in use has one and all units are from the current frame. """
+        indices1 = units1._frame_indices
+        indices2 = units2._frame_indices
+        if indices1 is not None and indices2 is not None:
+            if self._distance_method_in_use == 4:
+                return self._lazy_distances_block(indices1, indices2)
+            if self._distance_method_in_use in {2, 3}:
+                return self._cdist[np.ix_(indices1, indices2)]
+        return cdist(units1.positions, units2.positions, "sqeuclidean")
+
     # Distance calculation using the fastest distance calculation functions
 
     def _distance_pos_to_pos(self, pos1: Tuple[float, float], pos2: Tuple[float, float]) -> float:
@@ -207,14 +314,57 @@ class DistanceCalculation:
         pos = unit.position_tuple
         return (self.distance_math_hypot(p, pos) for p in points)
 
+    def _precalculate_distances(self):
+        """ Forces distance calculation and caching on all units using scipy pdist or cdist if the method in use requires it. """
+        if self._distance_method_in_use == 1:
+            _ = self._unit_index_dict
+            _ = self._pdist
+        elif self._distance_method_in_use in {2, 3}:
+            _ = self._unit_index_dict
+            _ = self._cdist
+
+    def _distance_squared_unit_to_unit_counted(self, unit1: Unit, unit2: Unit) -> float:
+        """ Used by the "auto" method to count how many distances are requested each frame. """
+        self._distance_queries_this_frame += 1
+        return self._distance_squared_unit_to_unit_in_use(unit1, unit2)
+
+    def _select_distance_method(self):
+        """ Used by the "auto" method, called once per frame before the distances are precalculated.
+        Selects the method that is estimated to be the fastest for the current amount of units and the average amount of requested distances per frame.
+        The methods are benchmarked once in '_calibrate_distance_methods' before the game starts. """
+        self._distance_queries_per_frame = (
+            0.8 * self._distance_queries_per_frame + 0.2 * self._distance_queries_this_frame
+        )
+        self._distance_queries_this_frame = 0
+        units_count = self._units_count
+        estimated_costs = {}
+        for method, results in self._distance_benchmark.items():
+            unit_counts = sorted(results)
+            precalculation_time = np.interp(units_count, unit_counts, [results[count][0] for count in unit_counts])
+            query_time = np.interp(units_count, unit_counts, [results[count][1] for count in unit_counts])
+            estimated_costs[method] = precalculation_time + self._distance_queries_per_frame * query_time
+        method = min(estimated_costs, key=estimated_costs.get)
+        if method != self._distance_method_in_use or self._distance_squared_unit_to_unit_in_use is None:
+            self._distances_override_functions(method)
+            self._distance_squared_unit_to_unit_in_use = self._distance_squared_unit_to_unit
+            self._distance_squared_unit_to_unit = self._distance_squared_unit_to_unit_counted
+
+    def _calibrate_distance_methods(self):
+        """ Used by the "auto" method, benchmarks the methods it chooses from. Called from bot_ai.py self._prepare_start(), so it does not take time from a game step. """
+        self._distance_benchmark = benchmark_distance_methods(methods=AUTO_DISTANCE_METHODS, repeats=1)
+
     def _distances_override_functions(self, method: int = 0):
         """ Overrides the internal distance calculation functions at game start in bot_ai.py self._prepare_start() function
         method 0: Use python's math.hypot
         The following methods calculate the distances between all units once:
         method 1: Use scipy's pdist condensed matrix (1d array)
         method 2: Use scipy's cidst square matrix (2d array)
-        method 3: Use scipy's cidst square matrix (2d array) without asserts (careful: very weird error messages, but maybe slightly faster) """
-        assert 0 <= method <= 3, f"Selected method was: {method}"
+        method 3: Use scipy's cidst square matrix (2d array) without asserts (careful: very weird error messages, but maybe slightly faster)
+        The following method only calculates the distances that are requested:
+        method 4: Use a square matrix (2d array) that is filled lazily, distances of units that did not move are kept over several frames
+        The method can also be set to "auto" in 'self.distance_calculation_method', then one of the methods in AUTO_DISTANCE_METHODS is selected each frame, see '_select_distance_method' """
+        assert 0 <= method <= 4, f"Selected method was: {method}"
+        self._distance_method_in_use = method
         if method == 0:
             self._distance_squared_unit_to_unit = self._distance_squared_unit_to_unit_method0
         elif method == 1:
@@ -229,3 +379,92 @@ class DistanceCalculation:
             self._distance_squared_unit_to_unit = self._distance_squared_unit_to_unit_method2
             self.calculate_distances = self._calculate_distances_method3
             self._get_index_of_two_units = self._get_index_of_two_units_method3
+        elif method == 4:
+            self._distance_squared_unit_to_unit = self._distance_squared_unit_to_unit_method4
+            self._get_index_of_two_units = self._get_index_of_two_units_method2
+
+
+# Methods the "auto" distance calculation method chooses from, method 3 is left out as it only differs from method 2 by its missing asserts
+AUTO_DISTANCE_METHODS: Tuple[int, ...] = (0, 1, 2, 4)
+
+
+class _BenchmarkFrameStore:
+    """ Minimal stand-in for the FrameStore of one frame, has the columns that the distance calculation functions use. """
+
+    def __init__(self, tags: np.ndarray, positions: np.ndarray):
+        self.tag = tags
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.tag)
+
+
+class _BenchmarkGameState:
+    def __init__(self):
+        self.game_loop = 0
+
+
+def benchmark_distance_methods(
+    unit_counts: Iterable[int] = (50, 100, 250, 500, 1000),
+    methods: Iterable[int] = (0, 1, 2, 3, 4),
+    queries_per_frame: int = 200,
+    moving_units: float = 0.5,
+    repeats: int = 3,
+    seed: int = 0,
+) -> Dict[int, Dict[int, Tuple[float, float]]]:
+    """ Benchmarks the distance calculation methods on synthetic frames with randomly placed units on a 200x200 map.
+    The distances are requested between 'Unit' objects, so each query includes the cost of reading the unit's tag and position from its proto.
+    In each frame, the share 'moving_units' of the units moves and 'queries_per_frame' random unit to unit distances are requested.
+    Returns a dict of form {method: {unit count: (precalculation seconds per frame, seconds per requested distance)}}, each value is the best of 'repeats' frames.
+
+    Example::
+
+        from sc2.distances import benchmark_distance_methods
+        for method, results in benchmark_distance_methods().items():
+            print(method, {count: f"{precalculation * 1000:.3f}ms + {query * 1e6:.3f}us/query" for count, (precalculation, query) in results.items()})
+
+    :param unit_counts:
+    :param methods:
+    :param queries_per_frame:
+    :param moving_units:
+    :param repeats:
+    :param seed: """
+    random_generator = np.random.RandomState(seed)
+    results: Dict[int, Dict[int, Tuple[float, float]]] = {}
+    for method in methods:
+        results[method] = {}
+        for units_count in unit_counts:
+            calculation = DistanceCalculation()
+            calculation.state = _BenchmarkGameState()
+            calculation._distances_override_functions(method)
+            tags = np.arange(1, units_count + 1, dtype=np.uint64)
+            positions = random_generator.uniform(0, 200, size=(units_count, 2)).astype(np.float32)
+            best_precalculation = best_query = math.inf
+            # The first frame fills the caches of the lazy method, so it is not measured
+            for frame in range(repeats + 1):
+                moving = random_generator.uniform(size=units_count) < moving_units
+                positions = positions.copy()
+                positions[moving] += random_generator.uniform(-1, 1, size=(int(moving.sum()), 2))
+                calculation.state.game_loop = frame
+                calculation._frame_store = _BenchmarkFrameStore(tags, positions)
+                # Real units around unit protos, so the queries pay the same property and proto access as in a game
+                units = [
+                    Unit(raw_pb.Unit(tag=tag, pos=common_pb.Point(x=x, y=y)), calculation)
+                    for tag, (x, y) in zip(tags.tolist(), positions.tolist())
+                ]
+                pairs = random_generator.randint(0, units_count, size=(queries_per_frame, 2)).tolist()
+
+                time_start = time.perf_counter()
+                calculation._precalculate_distances()
+                if method == 4:
+                    # Otherwise done on the first requested distance of the frame
+                    calculation._update_lazy_distances()
+                time_precalculated = time.perf_counter()
+                for index1, index2 in pairs:
+                    calculation._distance_squared_unit_to_unit(units[index1], units[index2])
+                time_end = time.perf_counter()
+                if frame:
+                    best_precalculation = min(best_precalculation, time_precalculated - time_start)
+                    best_query = min(best_query, (time_end - time_precalculated) / queries_per_frame)
+            results[method][units_count] = (best_precalculation, best_query)
+    return results
@@ -0,0 +1,336 @@
+from __future__ import annotations
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .constants import ALL_GAS, FakeEffectID, geyser_ids, mineral_ids
+from .data import race_townhalls, race_worker
+from .game_state import Blip, EffectData
+from .ids.buff_id import BuffId
+from .ids.unit_typeid import UnitTypeId
+from .unit import Unit
+from .units import Units
+
+if TYPE_CHECKING:
+    from .bot_ai import BotAI
+
+# Indices of the unit groups that are exposed on the bot object, e.g. 'self.units' or 'self.mineral_field'
+GROUP_UNITS = 0
+GROUP_STRUCTURES = 1
+GROUP_WORKERS = 2
+GROUP_TOWNHALLS = 3
+GROUP_GAS_BUILDINGS = 4
+GROUP_LARVA = 5
+GROUP_ENEMY_UNITS = 6
+GROUP_ENEMY_STRUCTURES = 7
+GROUP_MINERAL_FIELD = 8
+GROUP_VESPENE_GEYSER = 9
+GROUP_RESOURCES = 10
+GROUP_DESTRUCTABLES = 11
+GROUP_WATCHTOWERS = 12
+GROUP_ALL_UNITS = 13
+GROUP_COUNT = 14
+
+TECHLAB_TYPES: Set[int] = {
+    UnitTypeId.TECHLAB.value,
+    UnitTypeId.BARRACKSTECHLAB.value,
+    UnitTypeId.FACTORYTECHLAB.value,
+    UnitTypeId.STARPORTTECHLAB.value,
+}
+REACTOR_TYPES: Set[int] = {
+    UnitTypeId.REACTOR.value,
+    UnitTypeId.BARRACKSREACTOR.value,
+    UnitTypeId.FACTORYREACTOR.value,
+    UnitTypeId.STARPORTREACTOR.value,
+}
+ALL_GAS_TYPES: Set[int] = {unit_type.value for unit_type in ALL_GAS}
+
+
+class GroupDiff:
+    """ Difference of one unit group between two frames, see 'FrameStore.diff_group'.
+    All attributes are arrays of frame store indices. """
+
+    __slots__ = ("new", "current", "previous", "gone")
+
+    def __init__(self, new: np.ndarray, current: np.ndarray, previous: np.ndarray, gone: np.ndarray):
+        """
+        :param new: Indices in the current frame of the units that were not in the group in the previous frame, in group order
+        :param current: Indices in the current frame of the units that were in the group in both frames, in group order
+        :param previous: Indices in the previous frame of these units, 'previous[i]' is the same unit as 'current[i]'
+        :param gone: Indices in the previous frame of the units that are not in the group any more, in previous group order
+        """
+        self.new: np.ndarray = new
+        self.current: np.ndarray = current
+        self.previous: np.ndarray = previous
+        self.gone: np.ndarray = gone
+
+
+class FrameStore:
+    """ Columnar storage of the units of one observation.
+    All columns are filled in a single pass over the raw units, 'Unit' objects are only created when they are accessed.
+    The index of a unit in the columns is its index in 'bot.all_units'. """
+
+    def __init__(self, bot_object: BotAI, raw_units=()):
+        """
+        :param bot_object:
+        :param raw_units:
+        """
+        self._bot_object: BotAI = bot_object
+        self.game_loop: int = bot_object.state.game_loop if bot_object.state is not None else 0
+        # Set of enemy units detected by own sensor tower, as blips have less unit information than normal visible units
+        self.blips: Set[Blip] = set()
+        # Reaper grenade, parasitic bomb dummy and forcefield units, they are converted to effects
+        self.fake_effects: Set[EffectData] = set()
+        self.techlab_tags: Set[int] = set()
+        self.reactor_tags: Set[int] = set()
+
+        static_unit_type_data = bot_object._game_data.static_unit_type_data if raw_units else None
+        protos = []
+        tags: List[int] = []
+        types: List[int] = []
+        alliances: List[int] = []
+        # Flat list of positions [x0, y0, x1, y1, ...]
+        flat_positions: List[float] = []
+        healths: List[float] = []
+        shields: List[float] = []
+        energies: List[float] = []
+        radii: List[float] = []
+        build_progresses: List[float] = []
+        order_counts: List[int] = []
+        structures: List[bool] = []
+        flying: List[bool] = []
+        groups: List[List[int]] = [[] for _ in range(GROUP_COUNT)]
+        townhall_types: Set[int] = set()
+        worker_type: int = -1
+        graviton_beam = BuffId.GRAVITONBEAM.value
+
+        for unit in raw_units:
+            if unit.is_blip:
+                self.blips.add(Blip(unit))
+                continue
+            unit_type: int = unit.unit_type
+            # Convert these units to effects: reaper grenade, parasitic bomb dummy, forcefield
+            if unit_type in FakeEffectID:
+                self.fake_effects.add(EffectData(unit, fake=True))
+                continue
+            is_structure = static_unit_type_data(unit_type).is_structure
+            index = len(protos)
+            pos = unit.pos
+            protos.append(unit)
+            tags.append(unit.tag)
+            types.append(unit_type)
+            alliance = unit.alliance
+            alliances.append(alliance)
+            flat_positions.append(pos.x)
+            flat_positions.append(pos.y)
+            healths.append(unit.health)
+            shields.append(unit.shield)
+            energies.append(unit.energy)
+            radii.append(unit.radius)
+            build_progresses.append(unit.build_progress)
+            order_counts.append(len(unit.orders))
+            structures.append(is_structure)
+            flying.append(unit.is_flying or graviton_beam in unit.buff_ids)
+
+            # Alliance.Neutral.value = 3
+            if alliance == 3:
+                # XELNAGATOWER = 149
+                if unit_type == 149:
+                    groups[GROUP_WATCHTOWERS].append(index)
+                # mineral field enums
+                elif unit_type in mineral_ids:
+                    groups[GROUP_MINERAL_FIELD].append(index)
+                    groups[GROUP_RESOURCES].append(index)
+                # geyser enums
+                elif unit_type in geyser_ids:
+                    groups[GROUP_VESPENE_GEYSER].append(index)
+                    groups[GROUP_RESOURCES].append(index)
+                # all destructable rocks
+                else:
+                    groups[GROUP_DESTRUCTABLES].append(index)
+            # Alliance.Self.value = 1
+            elif alliance == 1:
+                if worker_type == -1:
+                    townhall_types = {unit_id.value for unit_id in race_townhalls[bot_object.race]}
+                    worker_type = race_worker[bot_object.race].value
+                if is_structure:
+                    groups[GROUP_STRUCTURES].append(index)
+                    if unit_type in townhall_types:
+                        groups[GROUP_TOWNHALLS].append(index)
+                    elif unit_type in ALL_GAS_TYPES or unit.vespene_contents:
+                        # TODO: remove "or unit.vespene_contents" when a new linux client newer than version 4.10.0 is released
+                        groups[GROUP_GAS_BUILDINGS].append(index)
+                    elif unit_type in TECHLAB_TYPES:
+                        self.techlab_tags.add(unit.tag)
+                    elif unit_type in REACTOR_TYPES:
+                        self.reactor_tags.add(unit.tag)
+                else:
+                    groups[GROUP_UNITS].append(index)
+                    # TODO add burrowed drones
+                    if unit_type == worker_type:
+                        groups[GROUP_WORKERS].append(index)
+                    # LARVA = 151
+                    elif unit_type == 151:
+                        groups[GROUP_LARVA].append(index)
+            # Alliance.Enemy.value = 4
+            elif alliance == 4:
+                if is_structure:
+                    groups[GROUP_ENEMY_STRUCTURES].append(index)
+                else:
+                    groups[GROUP_ENEMY_UNITS].append(index)
+
+        self._protos = protos
+        self._unit_objects: List[Optional[Unit]] = [None] * len(protos)
+        self.tag: np.ndarray = np.array(tags, dtype=np.uint64)
+        self.type_id: np.ndarray = np.array(types, dtype=np.uint32)
+        self.alliance: np.ndarray = np.array(alliances, dtype=np.uint8)
+        # Positions of all units as float32 array of shape (n, 2), shared by the distance calculation, Units queries and the spatial index
+        self.positions: np.ndarray = np.array(flat_positions, dtype=np.float32).reshape((-1, 2))
+        self.x: np.ndarray = self.positions[:, 0]
+        self.y: np.ndarray = self.positions[:, 1]
+        self.health: np.ndarray = np.array(healths, dtype=np.float32)
+        self.shield: np.ndarray = np.array(shields, dtype=np.float32)
+        self.energy: np.ndarray = np.array(energies, dtype=np.float32)
+        self.radius: np.ndarray = np.array(radii, dtype=np.float32)
+        self.build_progress: np.ndarray = np.array(build_progresses, dtype=np.float32)
+        self.order_count: np.ndarray = np.array(order_counts, dtype=np.uint8)
+        self.is_structure: np.ndarray = np.array(structures, dtype=bool)
+        self.is_flying: np.ndarray = np.array(flying, dtype=bool)
+        groups[GROUP_ALL_UNITS] = list(range(len(protos)))
+        self._group_indices: List[List[int]] = groups
+        self._group_units: List[Optional[Units]] = [None] * GROUP_COUNT
+        self._group_tag_maps: List[Optional[Dict[int, Unit]]] = [None] * GROUP_COUNT
+        # Per group a dict of unit type id: indices of the units of that type, created when a group is first selected by type
+        self._group_type_buckets: List[Optional[Dict[int, np.ndarray]]] = [None] * GROUP_COUNT
+        self._spatial_index: Optional[cKDTree] = None
+
+    def __len__(self) -> int:
+        return len(self._protos)
+
+    @property
+    def spatial_index(self) -> cKDTree:
+        """ Returns a KD-tree over the positions of all units of this frame. """
+        if self._spatial_index is None:
+            self._spatial_index = cKDTree(self.positions)
+        return self._spatial_index
+
+    def indices_in_circle(self, position, radius: float) -> np.ndarray:
+        """ Returns the indices of all units that are at most 'radius' away from 'position'.
+        'position' may be a single position or an array of positions of shape (k, 2), then the indices of units close to any of them are returned.
+
+        :param position:
+        :param radius: """
+        if not self._protos:
+            return np.empty(0, dtype=np.intp)
+        found = self.spatial_index.query_ball_point(position, radius)
+        if isinstance(found, list):
+            return np.array(found, dtype=np.intp)
+        return np.fromiter(chain.from_iterable(found.tolist()), dtype=np.intp)
+
+    def unit(self, index: int) -> Unit:
+        """ Returns the unit at index 'index' of this frame, the 'Unit' object is created on first access. """
+        unit = self._unit_objects[index]
+        if unit is None:
+            unit = Unit(self._protos[index], self._bot_object)
+            unit.game_loop = self.game_loop
+            unit._frame_index = index
+            self._unit_objects[index] = unit
+        return unit
+
+    def indices_of(self, units: Iterable[Unit]) -> Optional[np.ndarray]:
+        """ Returns the indices of the given units in this store as numpy array.
+        Returns None if one of the units was not taken from this frame, e.g. if it was saved from a previous frame. """
+        protos = self._protos
+        indices: List[int] = []
+        try:
+            for unit in units:
+                index = unit._frame_index
+                if protos[index] is not unit._proto:
+                    return None
+                indices.append(index)
+        except IndexError:
+            return None
+        return np.array(indices, dtype=np.intp)
+
+    def units_at(self, indices) -> Units:
+        """ Returns a new Units object containing the units at the given indices. """
+        unit = self.unit
+        if isinstance(indices, np.ndarray):
+            units = Units([unit(index) for index in indices.tolist()], self._bot_object)
+        else:
+            units = Units([unit(index) for index in indices], self._bot_object)
+        units._indices = np.array(indices, dtype=np.intp)
+        units._indices_store = self
+        return units
+
+    def group(self, group: int) -> Units:
+        """ Returns the Units object of one of the GROUP_* constants, it is only created once per frame. """
+        units = self._group_units[group]
+        if units is None:
+            units = self.units_at(self._group_indices[group])
+            units._frame_group = group
+            units._frame_group_store = self
+            self._group_units[group] = units
+        return units
+
+    def group_tag_map(self, group: int) -> Dict[int, Unit]:
+        """ Returns a dict of tag: unit of the units of one of the GROUP_* constants, it is only created once per frame. """
+        tag_map = self._group_tag_maps[group]
+        if tag_map is None:
+            tag_map = {unit.tag: unit for unit in self.group(group)}
+            self._group_tag_maps[group] = tag_map
+        return tag_map
+
+    def diff_group(self, previous: FrameStore, group: int) -> GroupDiff:
+        """ Compares one of the GROUP_* constants of this frame with the same group of the previous frame by the unit tags.
+
+        :param previous:
+        :param group: """
+        current_indices = np.array(self._group_indices[group], dtype=np.intp)
+        previous_indices = np.array(previous._group_indices[group], dtype=np.intp)
+        _, current_matched, previous_matched = np.intersect1d(
+            self.tag[current_indices], previous.tag[previous_indices], assume_unique=True, return_indices=True
+        )
+        # intersect1d returns the matches sorted by tag, sort them by their position in the current group
+        order = np.argsort(current_matched)
+        current_matched = current_matched[order]
+        previous_matched = previous_matched[order]
+        is_new = np.ones(len(current_indices), dtype=bool)
+        is_new[current_matched] = False
+        is_gone = np.ones(len(previous_indices), dtype=bool)
+        is_gone[previous_matched] = False
+        return GroupDiff(
+            current_indices[is_new],
+            current_indices[current_matched],
+            previous_indices[previous_matched],
+            previous_indices[is_gone],
+        )
+
+    def group_of_types(self, group: int, unit_types: Iterable[int]) -> Units:
+        """ Returns a new Units object with the units of one of the GROUP_* constants that have one of the given unit type ids.
+        The units are looked up in the type buckets of the group instead of checking every unit of the group. """
+        buckets = self._group_type_buckets[group]
+        if buckets is None:
+            group_indices = np.array(self._group_indices[group], dtype=np.intp)
+            group_types = self.type_id[group_indices]
+            # Stable sort keeps the units of each type in the same order as in the group
+            order = np.argsort(group_types, kind="stable")
+            unique_types, starts = np.unique(group_types[order], return_index=True)
+            buckets = {
+                unit_type: bucket
+                for unit_type, bucket in zip(unique_types.tolist(), np.split(group_indices[order], starts[1:]))
+            }
+            self._group_type_buckets[group] = buckets
+        selected = [buckets[unit_type] for unit_type in unit_types if unit_type in buckets]
+        if not selected:
+            return self.units_at([])
+        if len(selected) == 1:
+            return self.units_at(selected[0])
+        return self.units_at(np.sort(np.concatenate(selected)))
+
+    @property
+    def all_units(self) -> Units:
+        """ Returns all units of this frame, excluding blips and fake effects. """
+        return self.group(GROUP_ALL_UNITS)
@@ -1,9 +1,23 @@
 from __future__ import annotations
 from bisect import bisect_left
 from functools import lru_cache
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
-
-from .constants import ZERGLING
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+
+from .constants import (
+    IS_ARMORED,
+    IS_BIOLOGICAL,
+    IS_LIGHT,
+    IS_MASSIVE,
+    IS_MECHANICAL,
+    IS_PSIONIC,
+    IS_STRUCTURE,
+    TARGET_AIR,
+    TARGET_BOTH,
+    TARGET_GROUND,
+    UNIT_BATTLECRUISER,
+    UNIT_ORACLE,
+    ZERGLING,
+)
 from .data import Attribute, Race
 from .ids.ability_id import AbilityId
 from .ids.unit_typeid import UnitTypeId
@@ -26,6 +40,16 @@ class GameData:
         self.upgrades = {u.upgrade_id: UpgradeData(self, u) for u in data.upgrades}
         # Cached UnitTypeIds so that conversion does not take long. This needs to be moved elsewhere if a new GameData object is created multiple times per game
         self.unit_types: Dict[int, UnitTypeId] = {}
+        # Static data per unit type id, created once per unit type when it is first requested
+        self.static_unit_types: Dict[int, StaticUnitTypeData] = {}
+
+    def static_unit_type_data(self, unit_type: int) -> StaticUnitTypeData:
+        """ Returns the data of the unit type that is used by every Unit object of that type. """
+        static_data = self.static_unit_types.get(unit_type)
+        if static_data is None:
+            static_data = StaticUnitTypeData(self.units[unit_type])
+            self.static_unit_types[unit_type] = static_data
+        return static_data
 
     @lru_cache(maxsize=256)
     def calculate_ability_cost(self, ability) -> Cost:
@@ -113,6 +137,16 @@ class AbilityData:
         """ For Stimpack this returns 'Research Stimpack' """
         return self._proto.friendly_name
 
+    @property
+    def is_building(self) -> bool:
+        """ Returns True if this ability places a structure, e.g. for 'ZergBuild_SpawningPool' """
+        return self._proto.is_building
+
+    @property
+    def footprint_radius(self) -> float:
+        """ Half of the side length of the square footprint of the placed structure, e.g. 1.5 for a 3x3 structure """
+        return self._proto.footprint_radius
+
     @property
     def is_free_morph(self) -> bool:
         if any(free in self._proto.link_name for free in FREE_ABILITIES):
@@ -248,6 +282,81 @@ class UnitTypeData:
         )
 
 
+class StaticUnitTypeData:
+    """ Attributes, weapons, ranges and cargo size of a unit type, read once from the UnitTypeData proto.
+    The Unit class reads these instead of descending into the proto on every access. """
+
+    __slots__ = (
+        "attributes",
+        "is_structure",
+        "is_light",
+        "is_armored",
+        "is_biological",
+        "is_mechanical",
+        "is_massive",
+        "is_psionic",
+        "weapons",
+        "can_attack",
+        "can_attack_both",
+        "can_attack_ground",
+        "can_attack_air",
+        "ground_dps",
+        "ground_range",
+        "air_dps",
+        "air_range",
+        "bonus_damage",
+        "cargo_size",
+    )
+
+    def __init__(self, unit_type_data: UnitTypeData):
+        """
+        :param unit_type_data:
+        """
+        proto = unit_type_data._proto
+        unit_id = proto.unit_id
+        self.attributes: FrozenSet[int] = frozenset(proto.attributes)
+        self.is_structure: bool = IS_STRUCTURE in self.attributes
+        self.is_light: bool = IS_LIGHT in self.attributes
+        self.is_armored: bool = IS_ARMORED in self.attributes
+        self.is_biological: bool = IS_BIOLOGICAL in self.attributes
+        self.is_mechanical: bool = IS_MECHANICAL in self.attributes
+        self.is_massive: bool = IS_MASSIVE in self.attributes
+        self.is_psionic: bool = IS_PSIONIC in self.attributes
+        self.weapons: tuple = tuple(proto.weapons)
+        self.cargo_size: int = proto.cargo_size
+
+        # TODO BATTLECRUISER doesnt have weapons in proto?!
+        is_battlecruiser = unit_id == UNIT_BATTLECRUISER.value
+        is_oracle = unit_id == UNIT_ORACLE.value
+        ground_weapon = next((weapon for weapon in self.weapons if weapon.type in TARGET_GROUND), None)
+        air_weapon = next((weapon for weapon in self.weapons if weapon.type in TARGET_AIR), None)
+        self.can_attack: bool = bool(self.weapons) or is_battlecruiser or is_oracle
+        self.can_attack_both: bool = is_battlecruiser or any(weapon.type in TARGET_BOTH for weapon in self.weapons)
+        self.can_attack_ground: bool = is_battlecruiser or is_oracle or ground_weapon is not None
+        self.can_attack_air: bool = is_battlecruiser or air_weapon is not None
+        self.ground_dps: float = (
+            (ground_weapon.damage * ground_weapon.attacks) / ground_weapon.speed if ground_weapon else 0
+        )
+        self.air_dps: float = (air_weapon.damage * air_weapon.attacks) / air_weapon.speed if air_weapon else 0
+        if is_oracle:
+            self.ground_range: float = 4
+        elif is_battlecruiser:
+            self.ground_range: float = 6
+        else:
+            self.ground_range: float = ground_weapon.range if ground_weapon else 0
+        if is_battlecruiser:
+            self.air_range: float = 6
+        else:
+            self.air_range: float = air_weapon.range if air_weapon else 0
+        # TODO: Consider units with ability attacks (Oracle, Baneling) or multiple attacks (Thor).
+        self.bonus_damage: Optional[Tuple[float, str]] = None
+        for weapon in self.weapons:
+            if weapon.damage_bonus:
+                bonus = weapon.damage_bonus[0]
+                self.bonus_damage = (bonus.bonus, Attribute(bonus.attribute).name)
+                break
+
+
 class UpgradeData:
     def __init__(self, game_data: GameData, proto):
         """
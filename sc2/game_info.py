@@ -1,11 +1,11 @@
 from __future__ import annotations
-from collections import deque
-from typing import Any, Deque, Dict, FrozenSet, Generator, List, Optional, Sequence, Set, Tuple, Union, TYPE_CHECKING
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple, Union, TYPE_CHECKING
 
 import numpy as np
+from scipy import ndimage
 
 from .cache import property_immutable_cache, property_mutable_cache
-from .pixel_map import PixelMap
+from .pixel_map import PixelMap, label_grid
 from .player import Player
 from .position import Point2, Rect, Size
 
@@ -236,6 +236,12 @@ class GameInfo:
         self.terrain_height: PixelMap = PixelMap(self._proto.start_raw.terrain_height, mirrored=False)
         # self.placement_grid[point]: if 0, point is not placeable, if 1, point is pathable
         self.placement_grid: PixelMap = PixelMap(self._proto.start_raw.placement_grid, in_bits=True, mirrored=False)
+        # Tiles whose pathing value changed in the last pathing grid update, see 'changed_pathing_tiles'
+        self._changed_pathing_tiles: Optional[Set[Point2]] = set()
+        # Sources of the changed tiles until they are first requested: the changed pixels of an incremental update,
+        # or the pathing grid before the update to compare the new one with
+        self._changed_pathing_pixels: Optional[np.ndarray] = None
+        self._previous_pathing_grid: Optional[PixelMap] = None
         self.playable_area = Rect.from_proto(self._proto.start_raw.playable_area)
         self.map_center = self.playable_area.center
         self.map_ramps: List[Ramp] = None  # Filled later by BotAI._prepare_first_step
@@ -246,74 +252,72 @@ class GameInfo:
         self.start_locations: List[Point2] = [Point2.from_proto(sl) for sl in self._proto.start_raw.start_locations]
         self.player_start_location: Point2 = None  # Filled later by BotAI._prepare_first_step
 
+    @property
+    def changed_pathing_tiles(self) -> Set[Point2]:
+        """ Tiles whose pathing value changed in the last pathing grid update, can be used to selectively invalidate pathing dependent caches.
+        They are only calculated when this is first accessed after an update. """
+        if self._changed_pathing_tiles is None:
+            changed_pixels = self._changed_pathing_pixels
+            if changed_pixels is None:
+                changed_pixels = self._previous_pathing_grid.changed_pixels(self.pathing_grid._proto)
+            self._changed_pathing_tiles = {Point2((x, y)) for x, y in changed_pixels.tolist()}
+            self._changed_pathing_pixels = None
+            self._previous_pathing_grid = None
+        return self._changed_pathing_tiles
+
+    @changed_pathing_tiles.setter
+    def changed_pathing_tiles(self, tiles: Set[Point2]):
+        self._changed_pathing_tiles = tiles
+        self._changed_pathing_pixels = None
+        self._previous_pathing_grid = None
+
+    def _update_pathing_grid(self, pathing_grid_proto, incremental: bool):
+        """ Sets the pathing grid to a new pathing grid proto of the game.
+
+        :param pathing_grid_proto:
+        :param incremental: If True, the pathing grid is updated in place, else it is replaced by a new pixel map """
+        self._changed_pathing_tiles = None
+        if incremental:
+            # The update has to find the changed pixels anyway, they are kept for 'changed_pathing_tiles'
+            self._changed_pathing_pixels = self.pathing_grid.update(pathing_grid_proto)
+            self._previous_pathing_grid = None
+        else:
+            self._changed_pathing_pixels = None
+            self._previous_pathing_grid = self.pathing_grid
+            self.pathing_grid = PixelMap(pathing_grid_proto, in_bits=True, mirrored=False)
+
     def _find_ramps_and_vision_blockers(self) -> Tuple[List[Ramp], Set[Point2]]:
         """ Calculate points that are pathable but not placeable.
         Then devide them into ramp points if not all points around the points are equal height
         and into vision blockers if they are. """
-
-        def equal_height_around(tile):
-            # mask to slice array 1 around tile
-            sliced = self.terrain_height.data_numpy[tile[1] - 1 : tile[1] + 2, tile[0] - 1 : tile[0] + 2]
-            return len(np.unique(sliced)) == 1
-
         map_area = self.playable_area
+        in_playable_area = np.zeros(self.pathing_grid.data_numpy.shape, dtype=bool)
+        in_playable_area[map_area.y : map_area.y + map_area.height, map_area.x : map_area.x + map_area.width] = True
         # all points in the playable area that are pathable but not placable
-        points = [
-            Point2((a, b))
-            for (b, a), value in np.ndenumerate(self.pathing_grid.data_numpy)
-            if value == 1
-            and map_area.x <= a < map_area.x + map_area.width
-            and map_area.y <= b < map_area.y + map_area.height
-            and self.placement_grid[(a, b)] == 0
-        ]
+        points = (self.pathing_grid.data_numpy == 1) & (self.placement_grid.data_numpy == 0) & in_playable_area
+        # a point has equal height around it if the minimum and maximum height of the 3x3 area around it are the same
+        height = self.terrain_height.data_numpy
+        equal_height_around = ndimage.minimum_filter(height, size=3, mode="nearest") == ndimage.maximum_filter(
+            height, size=3, mode="nearest"
+        )
+        # points on the lower and left map border are not considered to have equal height around them
+        equal_height_around[0, :] = False
+        equal_height_around[:, 0] = False
         # divide points into ramp points and vision blockers
-        rampPoints = [point for point in points if not equal_height_around(point)]
-        visionBlockers = set(point for point in points if equal_height_around(point))
-        ramps = [Ramp(group, self) for group in self._find_groups(rampPoints)]
-        return ramps, visionBlockers
+        vision_blocker_ys, vision_blocker_xs = np.nonzero(points & equal_height_around)
+        vision_blockers = {Point2((x, y)) for x, y in zip(vision_blocker_xs.tolist(), vision_blocker_ys.tolist())}
+        ramps = [Ramp(group, self) for group in self._find_groups(points & ~equal_height_around)]
+        return ramps, vision_blockers
 
-    def _find_groups(self, points: Set[Point2], minimum_points_per_group: int = 8):
+    def _find_groups(self, points: Union[np.ndarray, Set[Point2]], minimum_points_per_group: int = 8):
         """
-        From a set of points, this function will try to group points together by
-        painting clusters of points in a rectangular map using flood fill algorithm.
+        From a boolean grid (or a set of points), this function will group points together that are connected
+        horizontally, vertically or diagonally by labelling the connected components of the grid.
         Returns groups of points as list, like [{p1, p2, p3}, {p4, p5, p6, p7, p8}]
         """
-        # TODO do we actually need colors here? the ramps will never touch anyways.
-        NOT_COLORED_YET = -1
-        map_width = self.pathing_grid.width
-        map_height = self.pathing_grid.height
-        currentColor: int = NOT_COLORED_YET
-        picture: List[List[int]] = [[-2 for _ in range(map_width)] for _ in range(map_height)]
-
-        def paint(pt: Point2) -> None:
-            picture[pt.y][pt.x] = currentColor
-
-        nearby = [(a, b) for a in [-1, 0, 1] for b in [-1, 0, 1] if a != 0 or b != 0]
-
-        remaining: Set[Point2] = set(points)
-        for point in remaining:
-            paint(point)
-        currentColor = 1
-        queue: Deque[Point2] = deque()
-        while remaining:
-            currentGroup: Set[Point2] = set()
-            if not queue:
-                start = remaining.pop()
-                paint(start)
-                queue.append(start)
-                currentGroup.add(start)
-            while queue:
-                base: Point2 = queue.popleft()
-                for offset in nearby:
-                    px, py = base.x + offset[0], base.y + offset[1]
-                    if not (0 <= px < map_width and 0 <= py < map_height):
-                        continue
-                    if picture[py][px] != NOT_COLORED_YET:
-                        continue
-                    point: Point2 = Point2((px, py))
-                    remaining.discard(point)
-                    paint(point)
-                    queue.append(point)
-                    currentGroup.add(point)
-            if len(currentGroup) >= minimum_points_per_group:
-                yield currentGroup
+        if not isinstance(points, np.ndarray):
+            grid = np.zeros(self.pathing_grid.data_numpy.shape, dtype=bool)
+            for point in points:
+                grid[point[1], point[0]] = True
+            points = grid
+        return label_grid(points).all_points(minimum_size=minimum_points_per_group)
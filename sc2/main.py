@@ -107,8 +107,9 @@ async def _play_game_ai(client, player_id, ai, realtime, step_time_limit, game_t
         await ai.on_end(client._game_result[player_id])
         return client._game_result[player_id]
     gs = GameState(state.observation)
-    proto_game_info = await client._execute(game_info=sc_pb.RequestGameInfo())
-    ai._prepare_step(gs, proto_game_info)
+    ai._prepare_step(gs, None)
+    if ai._should_refresh_game_info(gs):
+        ai._update_pathing_grid(await client._execute(game_info=sc_pb.RequestGameInfo()))
     await ai.on_before_start()
     ai._prepare_first_step()
     try:
@@ -120,9 +121,18 @@ async def _play_game_ai(client, player_id, ai, realtime, step_time_limit, game_t
         return Result.Defeat
 
     iteration = 0
+    # Observation and game info responses of the last frame exchange, see Client.exchange_frame
+    exchanged_frame = None
     while True:
         if iteration != 0:
-            if realtime:
+            exchanged_game_info = None
+            # With a frame exchange, whether the game info is requested was already decided before the step
+            game_info_refresh_decided = exchanged_frame is not None
+            if exchanged_frame is not None:
+                # Failed actions of the exchange were already logged by the client
+                state, exchanged_game_info, _ = exchanged_frame
+                exchanged_frame = None
+            elif realtime:
                 # TODO: check what happens if a bot takes too long to respond for realtime=True, so that the requested game_loop might already be in the past
                 state = await client.observation(gs.game_loop + client.game_step)
             else:
@@ -142,8 +152,9 @@ async def _play_game_ai(client, player_id, ai, realtime, step_time_limit, game_t
             if game_time_limit and (gs.game_loop * 0.725 * (1 / 16)) > game_time_limit:
                 await ai.on_end(Result.Tie)
                 return Result.Tie
-            proto_game_info = await client._execute(game_info=sc_pb.RequestGameInfo())
-            ai._prepare_step(gs, proto_game_info)
+            ai._prepare_step(gs, exchanged_game_info)
+            if not game_info_refresh_decided and ai._should_refresh_game_info(gs):
+                ai._update_pathing_grid(await client._execute(game_info=sc_pb.RequestGameInfo()))
 
         logger.debug(f"Running AI step, it={iteration} {gs.game_loop * 0.725 * (1 / 16):.2f}s")
 
@@ -229,7 +240,13 @@ async def _play_game_ai(client, player_id, ai, realtime, step_time_limit, game_t
                 await ai.on_end(client._game_result[player_id])
                 return client._game_result[player_id]
 
-            await client.step()
+            if client.batched_frame_exchange:
+                # Send actions, debug draws, step, observation and game info at once and receive all responses
+                # The refresh policy is checked on the state of this step, so with "structures" or an int policy
+                # the pathing grid can be refreshed one step late instead of needing a separate game info request
+                exchanged_frame = await client.exchange_frame(game_info=ai._should_refresh_game_info(ai.state))
+            else:
+                await client.step()
 
         iteration += 1
 
@@ -268,8 +285,9 @@ async def _play_replay(client, ai, realtime=False, player_id=0):
         await ai.on_end(client._game_result[player_id])
         return client._game_result[player_id]
     gs = GameState(state.observation)
-    proto_game_info = await client._execute(game_info=sc_pb.RequestGameInfo())
-    ai._prepare_step(gs, proto_game_info)
+    ai._prepare_step(gs, None)
+    if ai._should_refresh_game_info(gs):
+        ai._update_pathing_grid(await client._execute(game_info=sc_pb.RequestGameInfo()))
     ai._prepare_first_step()
     try:
         await ai.on_start()
@@ -300,8 +318,9 @@ async def _play_replay(client, ai, realtime=False, player_id=0):
             gs = GameState(state.observation)
             logger.debug(f"Score: {gs.score.score}")
 
-            proto_game_info = await client._execute(game_info=sc_pb.RequestGameInfo())
-            ai._prepare_step(gs, proto_game_info)
+            ai._prepare_step(gs, None)
+            if ai._should_refresh_game_info(gs):
+                ai._update_pathing_grid(await client._execute(game_info=sc_pb.RequestGameInfo()))
 
         logger.debug(f"Running AI step, it={iteration} {gs.game_loop * 0.725 * (1 / 16):.2f}s")
 
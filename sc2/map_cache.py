@@ -0,0 +1,165 @@
+""" On-disk cache of the map analysis that is done in the first step of every game.
+
+Ramps, vision blockers and expansion locations only depend on the map, so they are stored in a NumPy '.npz' file per map
+and loaded again in the next game on the same map instead of being recomputed.
+The file is keyed by the map name and a hash of the placement grid, pathing grid and terrain height,
+so a changed map version never uses the analysis of an older one.
+The cache is disabled by default, it is enabled by setting the environment variable SC2MAPCACHE to the cache directory
+or by setting 'MAP_CACHE_DIRECTORY' before the game starts. """
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from .position import Point2
+from .units import Units
+
+if TYPE_CHECKING:
+    from .game_info import GameInfo, Ramp
+
+logger = logging.getLogger(__name__)
+
+# Increase this when the analysis or the file layout changes, old cache files are then ignored
+MAP_CACHE_VERSION = 1
+# Directory the cache files are stored in, None disables the cache
+MAP_CACHE_DIRECTORY: Optional[Path] = (
+    Path(os.environ["SC2MAPCACHE"]).expanduser().resolve() if os.environ.get("SC2MAPCACHE") else None
+)
+
+
+def map_cache_key(game_info: GameInfo) -> str:
+    """ Returns the file name of the cache file of this map: the map name followed by a hash of the static map grids. """
+    grid_hash = hashlib.sha1()
+    for grid in (game_info.placement_grid, game_info.pathing_grid, game_info.terrain_height):
+        grid_hash.update(np.ascontiguousarray(grid.data_numpy).tobytes())
+    map_name = re.sub(r"[^\w\-]", "_", game_info.map_name) or "unknown"
+    return f"{map_name}_{grid_hash.hexdigest()[:16]}.npz"
+
+
+class MapAnalysis:
+    """ Result of the first step map analysis, as it is stored in the cache file. """
+
+    def __init__(
+        self,
+        ramps: List[Set[Point2]],
+        vision_blockers: Set[Point2],
+        expansion_locations: Dict[Point2, List[Point2]],
+    ):
+        """
+        :param ramps: The points of each ramp
+        :param vision_blockers:
+        :param expansion_locations: The expansion positions and the positions of their resources
+        """
+        self.ramps: List[Set[Point2]] = ramps
+        self.vision_blockers: Set[Point2] = vision_blockers
+        self.expansion_locations: Dict[Point2, List[Point2]] = expansion_locations
+
+    @classmethod
+    def from_game_info(cls, game_info: GameInfo, expansion_locations: Dict[Point2, Units]) -> MapAnalysis:
+        return cls(
+            [ramp.points for ramp in game_info.map_ramps],
+            game_info.vision_blockers,
+            {
+                location: [resource.position for resource in resources]
+                for location, resources in expansion_locations.items()
+            },
+        )
+
+    def create_ramps(self, game_info: GameInfo) -> List[Ramp]:
+        # Imported here because game_info imports the bot through player.py
+        from .game_info import Ramp
+
+        return [Ramp(points, game_info) for points in self.ramps]
+
+    def create_expansion_locations(self, resources: Units) -> Optional[Dict[Point2, Units]]:
+        """ Assigns the resources of the current game to the cached expansion locations by their position.
+        Returns None if a cached resource can not be found, then the expansion locations have to be recalculated. """
+        resource_at_position = {resource.position: resource for resource in resources}
+        centers: Dict[Point2, Units] = {}
+        for location, resource_positions in self.expansion_locations.items():
+            location_resources = [resource_at_position.get(position) for position in resource_positions]
+            if None in location_resources:
+                return None
+            centers[location] = Units(location_resources, resources._bot_object)
+        return centers
+
+    def save(self, path: Path):
+        ramp_points, ramp_ids = _points_and_ids(self.ramps)
+        resource_positions, resource_ids = _points_and_ids(list(self.expansion_locations.values()))
+        temporary_path = path.with_name(path.name + ".tmp")
+        with open(temporary_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                version=np.array(MAP_CACHE_VERSION),
+                ramp_points=ramp_points.astype(np.int16),
+                ramp_ids=ramp_ids,
+                vision_blockers=np.array(sorted(self.vision_blockers), dtype=np.int16).reshape((-1, 2)),
+                expansion_locations=np.array(list(self.expansion_locations), dtype=np.float64).reshape((-1, 2)),
+                resource_positions=resource_positions,
+                resource_ids=resource_ids,
+            )
+        # Replace the file at once, so a bot running in parallel never reads a half written file
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[MapAnalysis]:
+        with np.load(path) as data:
+            if int(data["version"]) != MAP_CACHE_VERSION:
+                return None
+            vision_blockers = {Point2((x, y)) for x, y in data["vision_blockers"].tolist()}
+            ramps = _groups_of_points(data["ramp_points"], data["ramp_ids"])
+            resource_groups = _groups_of_points(data["resource_positions"], data["resource_ids"])
+            expansion_locations = {
+                Point2((x, y)): resource_groups[i] for i, (x, y) in enumerate(data["expansion_locations"].tolist())
+            }
+        return cls([set(points) for points in ramps], vision_blockers, expansion_locations)
+
+
+def _points_and_ids(groups: List) -> Tuple[np.ndarray, np.ndarray]:
+    """ Flattens groups of points to an array of shape (n, 2) and an array with the index of the group of each point. """
+    points = [point for group in groups for point in group]
+    ids = [i for i, group in enumerate(groups) for _ in group]
+    return np.array(points, dtype=np.float64).reshape((-1, 2)), np.array(ids, dtype=np.int32)
+
+
+def _groups_of_points(points: np.ndarray, ids: np.ndarray) -> List[List[Point2]]:
+    groups: List[List[Point2]] = [[] for _ in range(int(ids.max()) + 1 if len(ids) else 0)]
+    for (x, y), i in zip(points.tolist(), ids.tolist()):
+        groups[i].append(Point2((x, y)))
+    return groups
+
+
+def load_map_analysis(game_info: GameInfo) -> Optional[MapAnalysis]:
+    """ Returns the cached analysis of this map, or None if it is not cached yet, the cache file can not be used or the cache is disabled.
+    If None is returned, the analysis has to be saved again with 'save_map_analysis'. """
+    if MAP_CACHE_DIRECTORY is None:
+        return None
+    path = MAP_CACHE_DIRECTORY / map_cache_key(game_info)
+    if not path.is_file():
+        return None
+    try:
+        analysis = MapAnalysis.load(path)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning(f"Could not load map cache file '{path}': {e}")
+        return None
+    if analysis is None:
+        logger.info(f"Map cache file '{path}' was written by another version and is replaced")
+    return analysis
+
+
+def save_map_analysis(game_info: GameInfo, analysis: MapAnalysis):
+    """ Stores the analysis of this map in the cache directory, errors are logged and otherwise ignored. """
+    if MAP_CACHE_DIRECTORY is None:
+        return
+    path = MAP_CACHE_DIRECTORY / map_cache_key(game_info)
+    try:
+        MAP_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        analysis.save(path)
+    except OSError as e:
+        logger.warning(f"Could not save map cache file '{path}': {e}")
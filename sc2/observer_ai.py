@@ -228,6 +228,10 @@ class ObserverAI(DistanceCalculation):
             self._game_info.player_start_location = self.townhalls.first.position
         self._game_info.map_ramps, self._game_info.vision_blockers = self._game_info._find_ramps_and_vision_blockers()
 
+    def _should_refresh_game_info(self, state: GameState) -> bool:
+        """ The observer does not use the pathing grid, so the game info is never requested again after the game start. """
+        return False
+
     def _prepare_step(self, state, proto_game_info):
         """
         :param state:
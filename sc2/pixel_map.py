@@ -1,13 +1,97 @@
-from typing import Callable, FrozenSet, List, Set
+from typing import Callable, FrozenSet, List, Optional, Set, Tuple, Union
 
 import numpy as np
+from scipy import ndimage
 
 from .position import Point2
 
+# Structuring elements for connected component labelling, 4 connects only horizontal and vertical neighbors
+CONNECTIVITY_STRUCTURES = {
+    4: ndimage.generate_binary_structure(2, 1),
+    8: ndimage.generate_binary_structure(2, 2),
+}
+
+
+class PixelMapComponents:
+    """ Connected components of a boolean grid, returned by 'PixelMap.label' and 'label_grid'.
+    Component ids start at 1, the label 0 marks pixels that are not part of any component.
+    Index 'i' of 'sizes', 'bounding_boxes' and 'centroids' describes the component with id 'i + 1'. """
+
+    def __init__(self, labels: np.ndarray, count: int):
+        """
+        :param labels:
+        :param count:
+        """
+        # Array of shape (height, width) with the component id of every pixel
+        self.labels: np.ndarray = labels
+        self.count: int = count
+        ys, xs = np.nonzero(labels)
+        point_labels = labels[ys, xs]
+        # Number of pixels of each component
+        self.sizes: np.ndarray = np.bincount(point_labels, minlength=count + 1)[1:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Array of shape (count, 2) with the mean x and y coordinate of each component
+            self.centroids: np.ndarray = np.stack(
+                (
+                    np.bincount(point_labels, weights=xs, minlength=count + 1)[1:] / self.sizes,
+                    np.bincount(point_labels, weights=ys, minlength=count + 1)[1:] / self.sizes,
+                ),
+                axis=-1,
+            ).reshape((count, 2))
+        # Array of shape (count, 4) with the inclusive bounding box (x_min, y_min, x_max, y_max) of each component
+        self.bounding_boxes: np.ndarray = np.array(
+            [
+                (slice_x.start, slice_y.start, slice_x.stop - 1, slice_y.stop - 1)
+                for slice_y, slice_x in ndimage.find_objects(labels, max_label=count)
+            ],
+            dtype=np.int32,
+        ).reshape((count, 4))
+        # The pixels of the grid sorted by component, the pixels of component i are at [_starts[i - 1]:_starts[i]]
+        order = np.argsort(point_labels, kind="stable")
+        self._xs: np.ndarray = xs[order]
+        self._ys: np.ndarray = ys[order]
+        self._starts: np.ndarray = np.concatenate(([0], np.cumsum(self.sizes)))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def component_at(self, pos: Union[Point2, Tuple[int, int]]) -> int:
+        """ Returns the id of the component the pixel at 'pos' belongs to, or 0 if it is not part of any component or outside of the grid. """
+        x, y = int(pos[0]), int(pos[1])
+        height, width = self.labels.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return 0
+        return int(self.labels[y, x])
+
+    def points(self, component: int) -> Set[Point2]:
+        """ Returns the pixels of the component with the given id as set of points. """
+        if not 1 <= component <= self.count:
+            return set()
+        start, end = self._starts[component - 1], self._starts[component]
+        return {Point2((x, y)) for x, y in zip(self._xs[start:end].tolist(), self._ys[start:end].tolist())}
+
+    def all_points(self, minimum_size: int = 1) -> List[Set[Point2]]:
+        """ Returns the pixels of every component that has at least 'minimum_size' pixels, ordered by component id. """
+        return [self.points(component) for component in (np.flatnonzero(self.sizes >= minimum_size) + 1).tolist()]
+
+
+def label_grid(grid: np.ndarray, connectivity: int = 8) -> PixelMapComponents:
+    """ Labels the connected components of the non zero pixels of a 2d array.
+    With 'connectivity=8' pixels are connected horizontally, vertically and diagonally, with 'connectivity=4' only horizontally and vertically.
+
+    :param grid:
+    :param connectivity: """
+    assert connectivity in CONNECTIVITY_STRUCTURES, f"connectivity is {connectivity}, it should be 4 or 8"
+    labels, count = ndimage.label(grid, structure=CONNECTIVITY_STRUCTURES[connectivity])
+    return PixelMapComponents(labels, count)
+
 
 class PixelMap:
     def __init__(self, proto, in_bits: bool = False, mirrored: bool = False):
         """
+        The grid is not unpacked when the pixel map is created: single pixels are read directly from the raw bytes,
+        and 'data_numpy' is only created when it is first accessed.
+
         :param proto:
         :param in_bits:
         :param mirrored:
@@ -16,24 +100,40 @@ class PixelMap:
         # Used for copying pixelmaps
         self._in_bits: bool = in_bits
         self._mirrored: bool = mirrored
+        # The raw bytes of the grid, bit packed if 'in_bits' is True
+        self._buffer: bytes = self._proto.data
+        self._width: int = self._proto.size.x
+        self._height: int = self._proto.size.y
+
+        assert self._width * self._height == (8 if in_bits else 1) * len(
+            self._buffer
+        ), f"{self._width * self._height} {(8 if in_bits else 1)*len(self._buffer)}"
+        self._data_numpy: Optional[np.ndarray] = None
+
+    @property
+    def data_numpy(self) -> np.ndarray:
+        """ The grid as array of shape (height, width), bit packed grids are unpacked on first access. """
+        if self._data_numpy is None:
+            buffer_data = np.frombuffer(self._buffer, dtype=np.uint8)
+            if self._in_bits:
+                buffer_data = np.unpackbits(buffer_data)
+            data_numpy = buffer_data.reshape(self._height, self._width)
+            if self._mirrored:
+                data_numpy = np.flipud(data_numpy)
+            self._data_numpy = data_numpy
+        return self._data_numpy
 
-        assert self.width * self.height == (8 if in_bits else 1) * len(
-            self._proto.data
-        ), f"{self.width * self.height} {(8 if in_bits else 1)*len(self._proto.data)}"
-        buffer_data = np.frombuffer(self._proto.data, dtype=np.uint8)
-        if in_bits:
-            buffer_data = np.unpackbits(buffer_data)
-        self.data_numpy = buffer_data.reshape(self._proto.size.y, self._proto.size.x)
-        if mirrored:
-            self.data_numpy = np.flipud(self.data_numpy)
+    @data_numpy.setter
+    def data_numpy(self, value: np.ndarray):
+        self._data_numpy = value
 
     @property
     def width(self):
-        return self._proto.size.x
+        return self._width
 
     @property
     def height(self):
-        return self._proto.size.y
+        return self._height
 
     @property
     def bits_per_pixel(self):
@@ -47,7 +147,47 @@ class PixelMap:
         """ Example usage: is_pathable = self._game_info.pathing_grid[Point2((20, 20))] != 0 """
         assert 0 <= pos[0] < self.width, f"x is {pos[0]}, self.width is {self.width}"
         assert 0 <= pos[1] < self.height, f"y is {pos[1]}, self.height is {self.height}"
-        return int(self.data_numpy[pos[1], pos[0]])
+        if self._data_numpy is not None:
+            return int(self._data_numpy[pos[1], pos[0]])
+        # Read the pixel directly from the raw bytes
+        x, y = int(pos[0]), int(pos[1])
+        if self._mirrored:
+            y = self._height - 1 - y
+        index = y * self._width + x
+        if self._in_bits:
+            return (self._buffer[index >> 3] >> (7 - (index & 7))) & 1
+        return self._buffer[index]
+
+    def values_at(self, positions) -> np.ndarray:
+        """ Returns the values of many pixels at once as array, 'positions' is an array of shape (n, 2) with (x, y) coordinates.
+        Float coordinates are rounded down, like 'Point2.rounded'.
+        Example usage: pathable = self._game_info.pathing_grid.values_at(self.units.positions) == 1
+
+        :param positions: """
+        positions = np.asarray(positions)
+        if not positions.size:
+            return np.zeros(0, dtype=np.uint8)
+        positions = positions.reshape((-1, 2))
+        if not np.issubdtype(positions.dtype, np.integer):
+            positions = np.floor(positions)
+        xs = positions[:, 0].astype(np.intp)
+        ys = positions[:, 1].astype(np.intp)
+        assert (
+            (xs >= 0).all() and (xs < self.width).all()
+        ), f"x is between {xs.min()} and {xs.max()}, self.width is {self.width}"
+        assert (
+            (ys >= 0).all() and (ys < self.height).all()
+        ), f"y is between {ys.min()} and {ys.max()}, self.height is {self.height}"
+        if self._data_numpy is not None:
+            return self._data_numpy[ys, xs]
+        # Read the pixels directly from the raw bytes
+        if self._mirrored:
+            ys = self._height - 1 - ys
+        indices = ys * self._width + xs
+        buffer_data = np.frombuffer(self._buffer, dtype=np.uint8)
+        if self._in_bits:
+            return (buffer_data[indices >> 3] >> (7 - (indices & 7)).astype(np.uint8)) & 1
+        return buffer_data[indices]
 
     def __setitem__(self, pos, value):
         """ Example usage: self._game_info.pathing_grid[Point2((20, 20))] = 255 """
@@ -68,36 +208,78 @@ class PixelMap:
     def copy(self):
         return PixelMap(self._proto, in_bits=self._in_bits, mirrored=self._mirrored)
 
-    def flood_fill(self, start_point: Point2, pred: Callable[[int], bool]) -> Set[Point2]:
-        nodes: Set[Point2] = set()
-        queue: List[Point2] = [start_point]
+    def changed_pixels(self, proto) -> np.ndarray:
+        """ Returns the pixels whose value in 'proto' differs from the proto this pixel map was created from (or last updated with)
+        as array of shape (n, 2) with (x, y) coordinates. Only the bytes that differ are unpacked.
+        'proto' must have the same size and format as the proto of this pixel map.
 
-        while queue:
-            x, y = queue.pop()
+        :param proto: """
+        new_data = np.frombuffer(proto.data, dtype=np.uint8)
+        old_data = np.frombuffer(self._buffer, dtype=np.uint8)
+        changed_bytes = np.flatnonzero(new_data != old_data)
+        if self._in_bits:
+            # Every byte holds 8 pixels, only keep the pixels of the changed bytes that actually changed
+            changed_bits = np.unpackbits(new_data[changed_bytes]) != np.unpackbits(old_data[changed_bytes])
+            flat_indices = (changed_bytes[:, None] * 8 + np.arange(8)).ravel()[changed_bits]
+        else:
+            flat_indices = changed_bytes
+        ys, xs = np.divmod(flat_indices, self.width)
+        if self._mirrored:
+            ys = self.height - 1 - ys
+        return np.stack((xs, ys), axis=-1)
 
-            if not (0 <= x < self.width and 0 <= y < self.height):
-                continue
+    def update(self, proto) -> np.ndarray:
+        """ Updates this pixel map in place to the data of 'proto', only the pixels that changed since the last update are written.
+        Returns the changed pixels as array of shape (n, 2) with (x, y) coordinates.
+        Pixels that were modified with '__setitem__' keep their value unless they changed in 'proto'.
 
-            if Point2((x, y)) in nodes:
-                continue
+        :param proto: """
+        if proto.size.x != self.width or proto.size.y != self.height or len(proto.data) != len(self._buffer):
+            # The size changed, nothing can be reused
+            self.__init__(proto, in_bits=self._in_bits, mirrored=self._mirrored)
+            ys, xs = np.indices(self.data_numpy.shape)
+            return np.stack((xs.ravel(), ys.ravel()), axis=-1)
+        changed = self.changed_pixels(proto)
+        self._proto = proto
+        self._buffer = proto.data
+        # If the grid was not unpacked yet, it is read from the new bytes
+        if len(changed) and self._data_numpy is not None:
+            if not self.data_numpy.flags.writeable:
+                self.data_numpy = self.data_numpy.copy()
+            new_data = np.frombuffer(self._buffer, dtype=np.uint8)
+            ys = changed[:, 1] if not self._mirrored else self.height - 1 - changed[:, 1]
+            flat_indices = ys * self.width + changed[:, 0]
+            if self._in_bits:
+                values = (new_data[flat_indices // 8] >> (7 - flat_indices % 8)) & 1
+            else:
+                values = new_data[flat_indices]
+            self.data_numpy[changed[:, 1], changed[:, 0]] = values
+        return changed
 
-            if pred(self[x, y]):
-                nodes.add(Point2((x, y)))
-                queue += [Point2((x + a, y + b)) for a in [-1, 0, 1] for b in [-1, 0, 1] if not (a == 0 and b == 0)]
-        return nodes
+    def mask(self, pred: Optional[Callable[[int], bool]] = None) -> np.ndarray:
+        """ Returns a boolean array of shape (height, width) which is True where 'pred' returns True for the pixel value.
+        'pred' is only called once per distinct pixel value. Without 'pred', all non zero pixels are True. """
+        if pred is None:
+            return self.data_numpy != 0
+        values, inverse = np.unique(self.data_numpy, return_inverse=True)
+        accepted = np.array([bool(pred(value)) for value in values.tolist()], dtype=bool)
+        return accepted[inverse].reshape(self.data_numpy.shape)
 
-    def flood_fill_all(self, pred: Callable[[int], bool]) -> Set[FrozenSet[Point2]]:
-        groups: Set[FrozenSet[Point2]] = set()
+    def label(self, pred: Optional[Callable[[int], bool]] = None, connectivity: int = 8) -> PixelMapComponents:
+        """ Labels the connected components of the pixels for which 'pred' returns True (all non zero pixels if 'pred' is None).
+        The result contains the label array and the size, bounding box and centroid of every component.
+        Example usage: regions = self.game_info.pathing_grid.label(connectivity=4)
 
-        for x in range(self.width):
-            for y in range(self.height):
-                if any((x, y) in g for g in groups):
-                    continue
+        :param pred:
+        :param connectivity: 8 connects pixels horizontally, vertically and diagonally, 4 only horizontally and vertically """
+        return label_grid(self.mask(pred), connectivity=connectivity)
 
-                if pred(self[x, y]):
-                    groups.add(frozenset(self.flood_fill(Point2((x, y)), pred)))
+    def flood_fill(self, start_point: Point2, pred: Callable[[int], bool], connectivity: int = 8) -> Set[Point2]:
+        components = self.label(pred, connectivity=connectivity)
+        return components.points(components.component_at(start_point))
 
-        return groups
+    def flood_fill_all(self, pred: Callable[[int], bool], connectivity: int = 8) -> Set[FrozenSet[Point2]]:
+        return {frozenset(points) for points in self.label(pred, connectivity=connectivity).all_points()}
 
     def print(self, wide=False):
         for y in range(self.height):
@@ -0,0 +1,206 @@
+""" Local building placement check.
+
+The placement grid of the map is combined with the structures, resources and creep of the current frame,
+so 'BotAI.find_placement' only has to send the candidate positions that fit here to the game for the final confirmation,
+instead of one placement query for each ring of positions around the target.
+Rules that are not known exactly, like the gap between townhalls and resources, are left to the game. """
+from __future__ import annotations
+import math
+from typing import Dict, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from .constants import geyser_ids, mineral_ids
+from .data import Race
+from .frame_store import (
+    ALL_GAS_TYPES,
+    GROUP_ENEMY_STRUCTURES,
+    GROUP_RESOURCES,
+    GROUP_STRUCTURES,
+    GROUP_UNITS,
+)
+from .ids.unit_typeid import UnitTypeId
+
+if TYPE_CHECKING:
+    from .bot_ai import BotAI
+    from .game_data import AbilityData
+
+# Zerg structures that can be placed without creep, all other zerg structures need creep below their whole footprint
+CREEP_EXEMPT_STRUCTURES: Set[int] = {
+    UnitTypeId.HATCHERY.value,
+    UnitTypeId.EXTRACTOR.value,
+    UnitTypeId.EXTRACTORRICH.value,
+    UnitTypeId.NYDUSCANAL.value,
+}
+# Protoss structures that can be placed outside of a power field
+POWER_EXEMPT_STRUCTURES: Set[int] = {
+    UnitTypeId.NEXUS.value,
+    UnitTypeId.PYLON.value,
+    UnitTypeId.ASSIMILATOR.value,
+    UnitTypeId.ASSIMILATORRICH.value,
+}
+# Radius of the power field of the units that power protoss structures
+POWER_FIELD_RADIUS: Dict[int, float] = {UnitTypeId.PYLON.value: 6.5, UnitTypeId.WARPPRISMPHASING.value: 3.75}
+# Footprint (width, height) of the unit types whose footprint is not in the game data
+FOOTPRINT_OVERRIDES: Dict[int, Tuple[int, int]] = {
+    **{mineral_id: (2, 1) for mineral_id in mineral_ids},
+    **{geyser_id: (3, 3) for geyser_id in geyser_ids},
+}
+
+
+def footprint_corner(positions: np.ndarray, footprint: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the x and y of the lower left tile of a footprint centered at each of the positions of shape (n, 2).
+    Like in the game, odd sized footprints are centered on a tile and even sized footprints on a tile corner.
+
+    :param positions:
+    :param footprint: """
+    width, height = footprint
+    x0 = np.floor(positions[:, 0] - width / 2 + 0.5).astype(np.intp)
+    y0 = np.floor(positions[:, 1] - height / 2 + 0.5).astype(np.intp)
+    return x0, y0
+
+
+class PlacementSolver:
+    """ Decides for the current frame which positions a building fits on without asking the game.
+    The check is permissive where the game rules are not known exactly, so a position that passes here still has to be
+    confirmed with 'Client.query_building_placement'. A position only fails here if it is not on the placement grid,
+    has the wrong creep or overlaps a structure or resource. """
+
+    def __init__(self, bot_object: BotAI):
+        """
+        :param bot_object:
+        """
+        self._bot_object: BotAI = bot_object
+        # Unit type id value that is placed by each building ability, to look up the footprint and race of the building
+        self._ability_unit_types: Dict[int, int] = {}
+        for unit_type_value, unit_type_data in bot_object._game_data.units.items():
+            creation_ability = unit_type_data.creation_ability
+            if creation_ability is not None and creation_ability.is_building:
+                self._ability_unit_types.setdefault(creation_ability._proto.ability_id, unit_type_value)
+        self._footprints: Dict[int, Tuple[int, int]] = dict(FOOTPRINT_OVERRIDES)
+        self._game_loop: int = -1
+        self._occupied: Optional[np.ndarray] = None
+        # Valid lower left tiles per (width, height, creep requirement) in this frame
+        self._valid_corners: Dict[Tuple[int, int, Optional[bool]], np.ndarray] = {}
+
+    def footprint(self, unit_type_value: int, radius: float = None) -> Optional[Tuple[int, int]]:
+        """ Returns the footprint (width, height) in tiles of a unit type.
+        It is read from the game data, unit types without a building ability fall back to the given unit radius.
+        Returns None if neither is known.
+
+        :param unit_type_value:
+        :param radius: """
+        footprint = self._footprints.get(unit_type_value)
+        if footprint is None:
+            unit_type_data = self._bot_object._game_data.units.get(unit_type_value)
+            creation_ability = unit_type_data.creation_ability if unit_type_data is not None else None
+            size = int(2 * creation_ability.footprint_radius) if creation_ability is not None else 0
+            if not size:
+                if radius is None:
+                    return None
+                size = max(1, int(2 * radius))
+            footprint = self._footprints[unit_type_value] = (size, size)
+        return footprint
+
+    def is_placeable(self, building: AbilityData, positions: np.ndarray) -> Optional[np.ndarray]:
+        """ Returns a bool array that is True for the positions of shape (n, 2) the building fits on in this frame,
+        or None if the building can not be checked locally, e.g. gas buildings and abilities that place no structure.
+
+        :param building:
+        :param positions: """
+        unit_type = self._ability_unit_types.get(building._proto.ability_id)
+        if unit_type is None or unit_type in ALL_GAS_TYPES:
+            return None
+        footprint = self.footprint(unit_type)
+        if footprint is None:
+            return None
+        self._update_frame()
+        race = self._bot_object._game_data.units[unit_type].race
+        if race == Race.Zerg:
+            needs_creep = None if unit_type in CREEP_EXEMPT_STRUCTURES else True
+        else:
+            needs_creep = False
+        valid_corners = self._valid_corners_of(footprint, needs_creep)
+
+        x0, y0 = footprint_corner(positions, footprint)
+        inside = (x0 >= 0) & (x0 < valid_corners.shape[1]) & (y0 >= 0) & (y0 < valid_corners.shape[0])
+        placeable = np.zeros(len(positions), dtype=bool)
+        placeable[inside] = valid_corners[y0[inside], x0[inside]]
+        if race == Race.Protoss and unit_type not in POWER_EXEMPT_STRUCTURES:
+            width, height = footprint
+            placeable &= self._is_powered(np.column_stack((x0 + width / 2, y0 + height / 2)))
+        return placeable
+
+    def _update_frame(self):
+        """ Clears the occupancy of the previous frame. """
+        game_loop = self._bot_object.state.game_loop
+        if game_loop != self._game_loop:
+            self._game_loop = game_loop
+            self._occupied = None
+            self._valid_corners = {}
+
+    def _paint_footprints(self, grid: np.ndarray, groups):
+        """ Marks the footprints of the ground units of the given frame store groups in the grid. """
+        store = self._bot_object._frame_store
+        type_ids = store.type_id.tolist()
+        radii = store.radius.tolist()
+        is_flying = store.is_flying.tolist()
+        positions = store.positions.tolist()
+        for group in groups:
+            for index in store._group_indices[group]:
+                if is_flying[index]:
+                    continue
+                width, height = self.footprint(type_ids[index], radii[index])
+                x, y = positions[index]
+                # Same as footprint_corner for a single position
+                x0 = math.floor(x - width / 2 + 0.5)
+                y0 = math.floor(y - height / 2 + 0.5)
+                grid[max(y0, 0) : y0 + height, max(x0, 0) : x0 + width] = True
+
+    @property
+    def occupied(self) -> np.ndarray:
+        """ Grid of the tiles that are covered by structures and resources in this frame.
+        Destructables are not painted, their footprints are not squares, so they are left to the placement grid
+        and the game. """
+        if self._occupied is None:
+            self._occupied = np.zeros(self._bot_object._game_info.placement_grid.data_numpy.shape, dtype=bool)
+            self._paint_footprints(self._occupied, (GROUP_STRUCTURES, GROUP_ENEMY_STRUCTURES, GROUP_RESOURCES))
+        return self._occupied
+
+    def _valid_corners_of(self, footprint: Tuple[int, int], needs_creep: Optional[bool]) -> np.ndarray:
+        """ Returns a bool grid indexed by [y, x] of the lower left tiles at which the footprint fits on free placeable tiles.
+
+        :param footprint:
+        :param needs_creep: True if all tiles need creep, False if no tile may have creep, None if creep does not matter """
+        key = (*footprint, needs_creep)
+        valid_corners = self._valid_corners.get(key)
+        if valid_corners is not None:
+            return valid_corners
+        bot = self._bot_object
+        allowed = (bot._game_info.placement_grid.data_numpy != 0) & ~self.occupied
+        if needs_creep is not None:
+            creep = bot.state.creep.data_numpy != 0
+            allowed &= creep if needs_creep else ~creep
+        # Box convolution over the summed area table: the amount of allowed tiles below each footprint
+        width, height = footprint
+        table = np.zeros((allowed.shape[0] + 1, allowed.shape[1] + 1), dtype=np.int32)
+        table[1:, 1:] = allowed.cumsum(axis=0).cumsum(axis=1)
+        allowed_tiles = (
+            table[height:, width:] - table[:-height, width:] - table[height:, :-width] + table[:-height, :-width]
+        )
+        valid_corners = self._valid_corners[key] = allowed_tiles == width * height
+        return valid_corners
+
+    def _is_powered(self, centers: np.ndarray) -> np.ndarray:
+        """ Returns a bool array that is True for the centers of shape (n, 2) that are in the power field of an own ready
+        pylon or phasing warp prism. """
+        store = self._bot_object._frame_store
+        type_ids = store.type_id.tolist()
+        build_progress = store.build_progress.tolist()
+        powered = np.zeros(len(centers), dtype=bool)
+        for group in (GROUP_STRUCTURES, GROUP_UNITS):
+            for index in store._group_indices[group]:
+                radius = POWER_FIELD_RADIUS.get(type_ids[index])
+                if radius is not None and build_progress[index] == 1:
+                    powered |= ((centers - store.positions[index]) ** 2).sum(axis=1) <= radius ** 2
+        return powered
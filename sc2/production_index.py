@@ -0,0 +1,90 @@
+from __future__ import annotations
+from collections import Counter
+from typing import Dict, Iterable, List, TYPE_CHECKING
+
+from .data import Race
+from .frame_store import GROUP_STRUCTURES, GROUP_UNITS
+
+if TYPE_CHECKING:
+    from .frame_store import FrameStore
+    from .game_data import GameData
+
+
+class ProductionIndex:
+    """ Index of everything that is in production in one frame: unit and structure orders, units and structures that are
+    not ready yet and research in ready structures.
+    It is built in a single pass over the own raw units, so 'already_pending' and similar functions are dictionary lookups.
+    All abilities are keyed by their exact ability id value, all unit types by their unit type id value. """
+
+    def __init__(self, frame_store: FrameStore, game_data: GameData, race: Race):
+        """
+        :param frame_store:
+        :param game_data:
+        :param race:
+        """
+        # Amount of orders of each ability, plus the units and structures that are not ready yet by their creation ability
+        self.ability_count: Counter = Counter()
+        # Highest build progress of the units and structures that are not ready yet by their creation ability
+        self.ability_max_progress: Dict[int, float] = {}
+        # Tags of the units and structures that have an order of each ability
+        self.ability_producer_tags: Dict[int, List[int]] = {}
+        # Progress of the first order of each ability in ready structures, used for upgrades
+        self.research_progress: Dict[int, float] = {}
+        # Highest build progress of the own structures by their unit type
+        self.structure_type_progress: Dict[int, float] = {}
+
+        protos = frame_store._protos
+        build_progress = frame_store.build_progress.tolist()
+        unit_type_data = game_data.units
+        ability_count = self.ability_count
+        ability_max_progress = self.ability_max_progress
+        ability_producer_tags = self.ability_producer_tags
+        research_progress = self.research_progress
+        structure_type_progress = self.structure_type_progress
+        is_terran = race == Race.Terran
+
+        for is_structure, group in ((False, GROUP_UNITS), (True, GROUP_STRUCTURES)):
+            for index in frame_store._group_indices[group]:
+                proto = protos[index]
+                progress: float = build_progress[index]
+                is_ready = progress == 1
+                for order in proto.orders:
+                    ability_id: int = order.ability_id
+                    ability_count[ability_id] += 1
+                    ability_producer_tags.setdefault(ability_id, []).append(proto.tag)
+                    if is_structure and is_ready and ability_id not in research_progress:
+                        research_progress[ability_id] = order.progress
+                if is_structure:
+                    unit_type: int = proto.unit_type
+                    structure_type_progress[unit_type] = max(structure_type_progress.get(unit_type, 0), progress)
+                if not is_ready:
+                    # If an SCV is constructing a building, already_pending would count this structure twice
+                    # (once from the SCV order, and once from "not structure.is_ready")
+                    if is_terran and is_structure:
+                        continue
+                    creation_ability = unit_type_data[proto.unit_type].creation_ability
+                    # Units without creation ability are counted with ability id 0, which no order has
+                    ability_id = creation_ability._proto.ability_id if creation_ability is not None else 0
+                    ability_count[ability_id] += 1
+                    ability_max_progress[ability_id] = max(ability_max_progress.get(ability_id, 0), progress)
+
+    def count(self, ability_id: int) -> int:
+        """ Returns the amount of orders of this ability plus the amount of units in production that are created by it. """
+        return self.ability_count[ability_id]
+
+    def max_progress(self, ability_id: int) -> float:
+        """ Returns the highest build progress of the units in production that are created by this ability, or 0. """
+        return self.ability_max_progress.get(ability_id, 0)
+
+    def producer_tags(self, ability_id: int) -> List[int]:
+        """ Returns the tags of the own units and structures that have an order of this ability. """
+        return self.ability_producer_tags.get(ability_id, [])
+
+    def upgrade_progress(self, research_ability_id: int) -> float:
+        """ Returns the progress of the research with this ability in a ready structure, or 0 if it is not researched. """
+        return self.research_progress.get(research_ability_id, 0)
+
+    def structure_progress(self, unit_types: Iterable[int]) -> float:
+        """ Returns the highest build progress of the own structures of the given unit type values, or 0. """
+        structure_type_progress = self.structure_type_progress
+        return max((structure_type_progress.get(unit_type, 0) for unit_type in unit_types), default=0)
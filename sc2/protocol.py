@@ -2,6 +2,8 @@ import asyncio
 
 import logging
 import sys
+from collections import deque
+from typing import Deque, Optional
 
 from s2clientprotocol import sc2api_pb2 as sc_pb
 
@@ -28,8 +30,16 @@ class Protocol:
         assert ws
         self._ws = ws
         self._status = None
+        # Futures of the requests that were sent with '_send' and whose responses were not received yet, in the order they were sent
+        # The game answers requests in the order they were sent, so the responses are received in the same order
+        self._pending_responses: Deque[asyncio.Future] = deque()
+        self._receive_task: Optional[asyncio.Task] = None
+        # Held while a request is sent, and while '_execute' waits for a response without the background receive task,
+        # so that only one coroutine at a time reads from the websocket
+        self._request_lock = asyncio.Lock()
 
     async def __request(self, request):
+        assert not self._pending_responses, "Responses are received in the background, use '_send'"
         logger.debug(f"Sending request: {request !r}")
         try:
             await self._ws.send_bytes(request.SerializeToString())
@@ -59,13 +69,81 @@ class Protocol:
         logger.debug(f"Response received")
         return response
 
-    async def _execute(self, **kwargs):
+    async def _receive_responses(self):
+        """ Receives the responses of the pending requests in order, until no requests are pending.
+        If receiving fails, all pending futures are failed with the error so that no caller of '_receive' waits forever. """
+        try:
+            while self._pending_responses:
+                response_bytes = await self._ws.receive_bytes()
+                response = sc_pb.Response()
+                response.ParseFromString(response_bytes)
+                logger.debug(f"Response received")
+                future = self._pending_responses.popleft()
+                # The future may have been cancelled, the response is still received to keep the order of the responses
+                if not future.done():
+                    future.set_result(response)
+        except TypeError:
+            logger.info("Cannot receive: Connection already closed.")
+            self._fail_pending_responses(ConnectionAlreadyClosed("Connection already closed."))
+        except asyncio.CancelledError:
+            while self._pending_responses:
+                self._pending_responses.popleft().cancel()
+            raise
+        except Exception as e:
+            logger.exception("Cannot receive responses.")
+            self._fail_pending_responses(e)
+
+    def _fail_pending_responses(self, exception: Exception):
+        """ Sets the exception on the futures of all requests whose responses were not received yet. """
+        while self._pending_responses:
+            future = self._pending_responses.popleft()
+            if not future.done():
+                future.set_exception(exception)
+
+    async def _send(self, **kwargs) -> asyncio.Future:
+        """ Sends a request without waiting for its response, which is then received in the background.
+        Returns a future that has to be passed to '_receive' to get the response.
+        Requests sent with '_send' and '_execute' are answered in the order they were sent. """
         assert len(kwargs) == 1, "Only one request allowed"
+        async with self._request_lock:
+            return await self.__send(sc_pb.Request(**kwargs))
 
-        request = sc_pb.Request(**kwargs)
+    async def __send(self, request) -> asyncio.Future:
+        """ Sends a request and adds its future to the pending responses, the request lock has to be held. """
+        logger.debug(f"Sending request: {request !r}")
+        try:
+            await self._ws.send_bytes(request.SerializeToString())
+        except TypeError:
+            logger.exception("Cannot send: Connection already closed.")
+            raise ConnectionAlreadyClosed("Connection already closed.")
+        logger.debug(f"Request sent")
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending_responses.append(future)
+        if self._receive_task is None or self._receive_task.done():
+            self._receive_task = asyncio.ensure_future(self._receive_responses())
+        return future
 
-        response = await self.__request(request)
+    async def _receive(self, future: asyncio.Future):
+        """ Waits for the response of a request that was sent with '_send'.
+        Responses should be awaited in the order their requests were sent, so that the client status is updated in order. """
+        response = await future
+        return self._handle_response(response)
 
+    async def _execute(self, **kwargs):
+        assert len(kwargs) == 1, "Only one request allowed"
+
+        request = sc_pb.Request(**kwargs)
+        async with self._request_lock:
+            if self._pending_responses:
+                # Responses of earlier requests are received in the background, the response of this request arrives after them
+                future = await self.__send(request)
+            else:
+                response = await self.__request(request)
+                return self._handle_response(response)
+        return await self._receive(future)
+
+    def _handle_response(self, response):
         new_status = Status(response.status)
         if new_status != self._status:
             logger.info(f"Client status changed to {new_status} (was {self._status})")
@@ -3,19 +3,11 @@ import warnings
 import math
 from typing import Any, Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 
-from .cache import property_immutable_cache, property_mutable_cache
+from .cache import property_mutable_cache
 from .constants import (
     transforming,
     DAMAGE_BONUS_PER_UPGRADE,
-    IS_STRUCTURE,
     IS_LIGHT,
-    IS_ARMORED,
-    IS_BIOLOGICAL,
-    IS_MECHANICAL,
-    IS_MASSIVE,
-    IS_PSIONIC,
-    UNIT_BATTLECRUISER,
-    UNIT_ORACLE,
     TARGET_GROUND,
     TARGET_AIR,
     TARGET_BOTH,
@@ -42,7 +34,6 @@ from .constants import (
 )
 from .data import (
     Alliance,
-    Attribute,
     CloakState,
     DisplayType,
     Race,
@@ -61,7 +52,12 @@ from .unit_command import UnitCommand
 
 if TYPE_CHECKING:
     from .bot_ai import BotAI
-    from .game_data import AbilityData, UnitTypeData
+    from .game_data import AbilityData, StaticUnitTypeData, UnitTypeData
+
+# Values of the carrying buffs, compared with the raw buff ids of the unit proto without creating BuffId objects
+CARRYING_MINERALS_BUFF_IDS: Set[int] = {buff_id.value for buff_id in IS_CARRYING_MINERALS}
+CARRYING_VESPENE_BUFF_IDS: Set[int] = {buff_id.value for buff_id in IS_CARRYING_VESPENE}
+CARRYING_RESOURCES_BUFF_IDS: Set[int] = {buff_id.value for buff_id in IS_CARRYING_RESOURCES}
 
 
 class UnitOrder:
@@ -89,6 +85,9 @@ class UnitOrder:
 
 
 class Unit:
+
+    __slots__ = ("_proto", "_bot_object", "cache", "game_loop", "_frame_index")
+
     def __init__(self, proto_data, bot_object: BotAI):
         """
         :param proto_data:
@@ -96,28 +95,36 @@ class Unit:
         """
         self._proto = proto_data
         self._bot_object: BotAI = bot_object
-        # Used by property_immutable_cache
-        self.cache = {}
+        # Used by the cached properties 'orders' and 'passengers', the dict is only created when one of them is accessed
+        self.cache: Optional[Dict[str, Any]] = None
         self.game_loop: int = bot_object.state.game_loop
+        # Index of this unit in the frame store of its game loop, -1 if it was not created by the frame store
+        self._frame_index: int = -1
 
     def __repr__(self) -> str:
         """ Returns string of this form: Unit(name='SCV', tag=4396941328). """
         return f"Unit(name={self.name !r}, tag={self.tag})"
 
-    @property_immutable_cache
+    @property
     def type_id(self) -> UnitTypeId:
         """ UnitTypeId found in sc2/ids/unit_typeid.
         Caches all type_ids of the same unit type. """
         unit_type = self._proto.unit_type
-        if unit_type not in self._bot_object._game_data.unit_types:
-            self._bot_object._game_data.unit_types[unit_type] = UnitTypeId(unit_type)
-        return self._bot_object._game_data.unit_types[unit_type]
+        unit_types = self._bot_object._game_data.unit_types
+        if unit_type not in unit_types:
+            unit_types[unit_type] = UnitTypeId(unit_type)
+        return unit_types[unit_type]
 
-    @property_immutable_cache
+    @property
     def _type_data(self) -> UnitTypeData:
         """ Provides the unit type data. """
         return self._bot_object._game_data.units[self._proto.unit_type]
 
+    @property
+    def _static_data(self) -> StaticUnitTypeData:
+        """ Provides the attributes, weapons, ranges and cargo size of the unit type, shared by all units of the same type. """
+        return self._bot_object._game_data.static_unit_type_data(self._proto.unit_type)
+
     @property
     def name(self) -> str:
         """ Returns the name of the unit. """
@@ -136,37 +143,37 @@ class Unit:
     @property
     def is_structure(self) -> bool:
         """ Checks if the unit is a structure. """
-        return IS_STRUCTURE in self._type_data.attributes
+        return self._static_data.is_structure
 
     @property
     def is_light(self) -> bool:
         """ Checks if the unit has the 'light' attribute. """
-        return IS_LIGHT in self._type_data.attributes
+        return self._static_data.is_light
 
     @property
     def is_armored(self) -> bool:
         """ Checks if the unit has the 'armored' attribute. """
-        return IS_ARMORED in self._type_data.attributes
+        return self._static_data.is_armored
 
     @property
     def is_biological(self) -> bool:
         """ Checks if the unit has the 'biological' attribute. """
-        return IS_BIOLOGICAL in self._type_data.attributes
+        return self._static_data.is_biological
 
     @property
     def is_mechanical(self) -> bool:
         """ Checks if the unit has the 'mechanical' attribute. """
-        return IS_MECHANICAL in self._type_data.attributes
+        return self._static_data.is_mechanical
 
     @property
     def is_massive(self) -> bool:
         """ Checks if the unit has the 'massive' attribute. """
-        return IS_MASSIVE in self._type_data.attributes
+        return self._static_data.is_massive
 
     @property
     def is_psionic(self) -> bool:
         """ Checks if the unit has the 'psionic' attribute. """
-        return IS_PSIONIC in self._type_data.attributes
+        return self._static_data.is_psionic
 
     @property
     def tech_alias(self) -> Optional[List[UnitTypeId]]:
@@ -182,101 +189,56 @@ class Unit:
         For SCV, this returns None """
         return self._type_data.unit_alias
 
-    @property_immutable_cache
+    @property
     def _weapons(self):
         """ Returns the weapons of the unit. """
-        try:
-            return self._type_data._proto.weapons
-        except:
-            return None
+        return self._static_data.weapons
 
-    @property_immutable_cache
+    @property
     def can_attack(self) -> bool:
         """ Checks if the unit can attack at all. """
-        # TODO BATTLECRUISER doesnt have weapons in proto?!
-        return bool(self._weapons) or self.type_id in {UNIT_BATTLECRUISER, UNIT_ORACLE}
+        return self._static_data.can_attack
 
-    @property_immutable_cache
+    @property
     def can_attack_both(self) -> bool:
         """ Checks if the unit can attack both ground and air units. """
-        if self.type_id == UNIT_BATTLECRUISER:
-            return True
-        if self._weapons:
-            return any(weapon.type in TARGET_BOTH for weapon in self._weapons)
-        return False
+        return self._static_data.can_attack_both
 
-    @property_immutable_cache
+    @property
     def can_attack_ground(self) -> bool:
         """ Checks if the unit can attack ground units. """
-        if self.type_id in {UNIT_BATTLECRUISER, UNIT_ORACLE}:
-            return True
-        if self._weapons:
-            return any(weapon.type in TARGET_GROUND for weapon in self._weapons)
-        return False
+        return self._static_data.can_attack_ground
 
-    @property_immutable_cache
+    @property
     def ground_dps(self) -> float:
         """ Returns the dps against ground units. Does not include upgrades. """
-        if self.can_attack_ground:
-            weapon = next((weapon for weapon in self._weapons if weapon.type in TARGET_GROUND), None)
-            if weapon:
-                return (weapon.damage * weapon.attacks) / weapon.speed
-        return 0
+        return self._static_data.ground_dps
 
-    @property_immutable_cache
+    @property
     def ground_range(self) -> float:
         """ Returns the range against ground units. Does not include upgrades. """
-        if self.type_id == UNIT_ORACLE:
-            return 4
-        if self.type_id == UNIT_BATTLECRUISER:
-            return 6
-        if self.can_attack_ground:
-            weapon = next((weapon for weapon in self._weapons if weapon.type in TARGET_GROUND), None)
-            if weapon:
-                return weapon.range
-        return 0
-
-    @property_immutable_cache
+        return self._static_data.ground_range
+
+    @property
     def can_attack_air(self) -> bool:
         """ Checks if the unit can air attack at all. Does not include upgrades. """
-        if self.type_id == UNIT_BATTLECRUISER:
-            return True
-        if self._weapons:
-            return any(weapon.type in TARGET_AIR for weapon in self._weapons)
-        return False
+        return self._static_data.can_attack_air
 
-    @property_immutable_cache
+    @property
     def air_dps(self) -> float:
         """ Returns the dps against air units. Does not include upgrades. """
-        if self.can_attack_air:
-            weapon = next((weapon for weapon in self._weapons if weapon.type in TARGET_AIR), None)
-            if weapon:
-                return (weapon.damage * weapon.attacks) / weapon.speed
-        return 0
+        return self._static_data.air_dps
 
-    @property_immutable_cache
+    @property
     def air_range(self) -> float:
         """ Returns the range against air units. Does not include upgrades. """
-        if self.type_id == UNIT_BATTLECRUISER:
-            return 6
-        if self.can_attack_air:
-            weapon = next((weapon for weapon in self._weapons if weapon.type in TARGET_AIR), None)
-            if weapon:
-                return weapon.range
-        return 0
-
-    @property_immutable_cache
+        return self._static_data.air_range
+
+    @property
     def bonus_damage(self):
         """ Returns a tuple of form '(bonus damage, armor type)' if unit does 'bonus damage' against 'armor type'.
         Possible armor typs are: 'Light', 'Armored', 'Biological', 'Mechanical', 'Psionic', 'Massive', 'Structure'. """
-        # TODO: Consider units with ability attacks (Oracle, Baneling) or multiple attacks (Thor).
-        if self._weapons:
-            for weapon in self._weapons:
-                if weapon.damage_bonus:
-                    b = weapon.damage_bonus[0]
-                    return (b.bonus, Attribute(b.attribute).name)
-        else:
-            return None
+        return self._static_data.bonus_damage
 
     @property
     def armor(self) -> float:
@@ -338,7 +300,7 @@ class Unit:
             return 0
         return self._proto.shield / self._proto.shield_max
 
-    @property_immutable_cache
+    @property
     def shield_health_percentage(self) -> float:
         """ Returns the percentage of combined shield + hp points the unit has.
         Also takes build progress into account. """
@@ -379,7 +341,7 @@ class Unit:
         """ Returns True if this Unit object is referenced from the future and is outdated. """
         return self.game_loop != self._bot_object.state.game_loop
 
-    @property_immutable_cache
+    @property
     def is_snapshot(self) -> bool:
         """ Checks if the unit is only available as a snapshot for the bot.
         Enemy buildings that have been scouted and are in the fog of war or
@@ -387,10 +349,10 @@ class Unit:
         # TODO: remove usage of bot.state.visibility when display_type is fixed by blizzard: https://github.com/Blizzard/s2client-proto/issues/167
         if self._proto.display_type == IS_SNAPSHOT:
             return True
-        position = self.position.rounded
-        return self._bot_object.state.visibility.data_numpy[position[1], position[0]] != 2
+        pos = self._proto.pos
+        return self._bot_object.state.visibility.data_numpy[math.floor(pos.y), math.floor(pos.x)] != 2
 
-    @property_immutable_cache
+    @property
     def is_visible(self) -> bool:
         """ Checks if the unit is visible for the bot.
         NOTE: This means the bot has vision of the position of the unit!
@@ -422,12 +384,13 @@ class Unit:
         """ Returns the 2d position of the unit as tuple without conversion to Point2. """
         return self._proto.pos.x, self._proto.pos.y
 
-    @property_immutable_cache
+    @property
     def position(self) -> Point2:
         """ Returns the 2d position of the unit. """
-        return Point2.from_proto(self._proto.pos)
+        pos = self._proto.pos
+        return Point2((pos.x, pos.y))
 
-    @property_immutable_cache
+    @property
     def position3d(self) -> Point3:
         """ Returns the 3d position of the unit. """
         return Point3.from_proto(self._proto.pos)
@@ -774,32 +737,32 @@ class Unit:
         """ Checks if the unit is revealed or not cloaked and therefore can be attacked. """
         return self._proto.cloak in CAN_BE_ATTACKED
 
-    @property_immutable_cache
+    @property
     def buffs(self) -> Set:
         """ Returns the set of current buffs the unit has. """
         return {BuffId(buff_id) for buff_id in self._proto.buff_ids}
 
-    @property_immutable_cache
+    @property
     def is_carrying_minerals(self) -> bool:
         """ Checks if a worker or MULE is carrying (gold-)minerals. """
-        return not IS_CARRYING_MINERALS.isdisjoint(self.buffs)
+        return not CARRYING_MINERALS_BUFF_IDS.isdisjoint(self._proto.buff_ids)
 
-    @property_immutable_cache
+    @property
     def is_carrying_vespene(self) -> bool:
         """ Checks if a worker is carrying vespene gas. """
-        return not IS_CARRYING_VESPENE.isdisjoint(self.buffs)
+        return not CARRYING_VESPENE_BUFF_IDS.isdisjoint(self._proto.buff_ids)
 
-    @property_immutable_cache
+    @property
     def is_carrying_resource(self) -> bool:
         """ Checks if a worker is carrying a resource. """
-        return not IS_CARRYING_RESOURCES.isdisjoint(self.buffs)
+        return not CARRYING_RESOURCES_BUFF_IDS.isdisjoint(self._proto.buff_ids)
 
     @property
     def detect_range(self) -> float:
         """ Returns the detection distance of the unit. """
         return self._proto.detect_range
 
-    @property_immutable_cache
+    @property
     def is_detector(self) -> bool:
         """ Checks if the unit is a detector. Has to be completed
         in order to detect and Photoncannons also need to be powered. """
@@ -904,16 +867,16 @@ class Unit:
         # TODO: add examples on how to use unit orders
         return [UnitOrder.from_proto(order, self._bot_object) for order in self._proto.orders]
 
-    @property_immutable_cache
+    @property
     def order_target(self) -> Optional[Union[int, Point2]]:
         """ Returns the target tag (if it is a Unit) or Point2 (if it is a Position)
         from the first order, returns None if the unit is idle """
-        if self.orders:
-            target = self.orders[0].target
-            if isinstance(target, int):
-                return target
-            else:
-                return Point2.from_proto(target)
+        orders = self._proto.orders
+        if orders:
+            order = orders[0]
+            if order.HasField("target_world_space_pos"):
+                return Point2.from_proto(order.target_world_space_pos)
+            return order.target_unit_tag
         return None
 
     @property
@@ -930,61 +893,63 @@ class Unit:
     def is_using_ability(self, abilities: Union[AbilityId, Set[AbilityId]]) -> bool:
         """ Check if the unit is using one of the given abilities.
         Only works for own units. """
-        if not self.orders:
+        orders = self._proto.orders
+        if not orders:
             return False
+        ability_id = self._bot_object._game_data.abilities[orders[0].ability_id].id
         if isinstance(abilities, AbilityId):
-            abilities = {abilities}
-        return self.orders[0].ability.id in abilities
+            return ability_id == abilities
+        return ability_id in abilities
 
-    @property_immutable_cache
+    @property
     def is_moving(self) -> bool:
         """ Checks if the unit is moving.
         Only works for own units. """
         return self.is_using_ability(AbilityId.MOVE)
 
-    @property_immutable_cache
+    @property
     def is_attacking(self) -> bool:
         """ Checks if the unit is attacking.
         Only works for own units. """
         return self.is_using_ability(IS_ATTACKING)
 
-    @property_immutable_cache
+    @property
     def is_patrolling(self) -> bool:
         """ Checks if a unit is patrolling.
         Only works for own units. """
         return self.is_using_ability(IS_PATROLLING)
 
-    @property_immutable_cache
+    @property
     def is_gathering(self) -> bool:
         """ Checks if a unit is on its way to a mineral field or vespene geyser to mine.
         Only works for own units. """
         return self.is_using_ability(IS_GATHERING)
 
-    @property_immutable_cache
+    @property
     def is_returning(self) -> bool:
         """ Checks if a unit is returning from mineral field or vespene geyser to deliver resources to townhall.
         Only works for own units. """
         return self.is_using_ability(IS_RETURNING)
 
-    @property_immutable_cache
+    @property
     def is_collecting(self) -> bool:
         """ Checks if a unit is gathering or returning.
         Only works for own units. """
         return self.is_using_ability(IS_COLLECTING)
 
-    @property_immutable_cache
+    @property
     def is_constructing_scv(self) -> bool:
         """ Checks if the unit is an SCV that is currently building.
         Only works for own units. """
         return self.is_using_ability(IS_CONSTRUCTING_SCV)
 
-    @property_immutable_cache
+    @property
     def is_transforming(self) -> bool:
         """ Checks if the unit transforming.
         Only works for own units. """
         return self.type_id in transforming and self.is_using_ability(transforming[self.type_id])
 
-    @property_immutable_cache
+    @property
     def is_repairing(self) -> bool:
         """ Checks if the unit is an SCV or MULE that is currently repairing.
         Only works for own units. """
@@ -1000,23 +965,23 @@ class Unit:
         """ Checks if unit has an addon attached. """
         return bool(self._proto.add_on_tag)
 
-    @property_immutable_cache
+    @property
     def has_techlab(self) -> bool:
         """ Check if a structure is connected to a techlab addon. This should only ever return True for BARRACKS, FACTORY, STARPORT. """
         return self.add_on_tag in self._bot_object.techlab_tags
 
-    @property_immutable_cache
+    @property
     def has_reactor(self) -> bool:
         """ Check if a structure is connected to a reactor addon. This should only ever return True for BARRACKS, FACTORY, STARPORT. """
         return self.add_on_tag in self._bot_object.reactor_tags
 
-    @property_immutable_cache
+    @property
     def add_on_land_position(self) -> Point2:
         """ If this unit is an addon (techlab, reactor), returns the position
         where a terran building (BARRACKS, FACTORY, STARPORT) has to land to connect to this addon. """
         return self.position.offset(Point2((-2.5, 0.5)))
 
-    @property_immutable_cache
+    @property
     def add_on_position(self) -> Point2:
         """ If this unit is a terran production building (BARRACKS, FACTORY, STARPORT),
         this property returns the position of where the addon should be, if it should build one or has one attached. """
@@ -1027,7 +992,7 @@ class Unit:
         """ Returns the units inside a Bunker, CommandCenter, PlanetaryFortress, Medivac, Nydus, Overlord or WarpPrism. """
         return {Unit(unit, self._bot_object) for unit in self._proto.passengers}
 
-    @property_mutable_cache
+    @property
     def passengers_tags(self) -> Set[int]:
         """ Returns the tags of the units inside a Bunker, CommandCenter, PlanetaryFortress, Medivac, Nydus, Overlord or WarpPrism. """
         return {unit.tag for unit in self._proto.passengers}
@@ -1046,7 +1011,7 @@ class Unit:
     @property
     def cargo_size(self) -> Union[float, int]:
         """ Returns the amount of cargo space the unit needs. """
-        return self._type_data.cargo_size
+        return self._static_data.cargo_size
 
     @property
     def cargo_max(self) -> Union[float, int]:
@@ -1075,7 +1040,7 @@ class Unit:
         a negative int if it has too few mining."""
         return self._proto.assigned_harvesters - self._proto.ideal_harvesters
 
-    @property_immutable_cache
+    @property
     def weapon_cooldown(self) -> float:
         """ Returns the time until the unit can fire again,
         returns -1 for units that can't attack.
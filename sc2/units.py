@@ -5,15 +5,21 @@ import math
 from itertools import chain
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 
+from .constants import UNIT_COLOSSUS
 from .ids.unit_typeid import UnitTypeId
 from .position import Point2, Point3
 from .unit import Unit
 import numpy as np
+from scipy.spatial.distance import cdist
 
 warnings.simplefilter("once")
 
+# Units objects with at least this many units use the spatial index of the current frame in 'closer_than', smaller ones are faster to check directly
+SPATIAL_INDEX_MIN_UNITS = 1000
+
 if TYPE_CHECKING:
     from .bot_ai import BotAI
+    from .frame_store import FrameStore
 
 
 class Units(list):
@@ -30,16 +36,103 @@ class Units(list):
         """
         super().__init__(units)
         self._bot_object = bot_object
+        # Cached (n, 2) array of unit positions, see Units.positions
+        self._positions: Optional[np.ndarray] = None
+        # Cached indices of the units in the frame store, see Units._frame_indices
+        self._indices: Optional[np.ndarray] = None
+        # The frame store that '_indices' refers to, the indices are only valid while it is the bot's current frame store
+        self._indices_store: Optional[FrameStore] = None
+        # Set by the frame store if this is one of the bot's unit collections like 'self.units', allows selecting units by type without a full scan
+        self._frame_group: Optional[int] = None
+        # The frame store that set '_frame_group', the group is only used while it is the bot's current frame store
+        self._frame_group_store: Optional[FrameStore] = None
 
     def __call__(self, *args, **kwargs):
-        return UnitSelection(self, *args, **kwargs)
+        return self.select(*args, **kwargs)
 
     def select(self, *args, **kwargs):
+        if self._current_frame_group is not None:
+            selection = args[0] if args else kwargs.get("selection")
+            if isinstance(selection, (UnitTypeId, set)):
+                return self._select_from_type_buckets(selection)
         return UnitSelection(self, *args, **kwargs)
 
+    @property
+    def _current_frame_group(self) -> Optional[int]:
+        """ Returns the GROUP_* constant of this object if it is one of the bot's unit collections of the current frame, else None. """
+        if self._frame_group is None or self._frame_group_store is not getattr(self._bot_object, "_frame_store", None):
+            return None
+        return self._frame_group
+
+    def _select_from_type_buckets(self, unit_types: Union[UnitTypeId, Set[UnitTypeId]]) -> Units:
+        """ Selects units by type from the type buckets of the frame store, only works on the bot's unit collections like 'self.units'. """
+        if isinstance(unit_types, UnitTypeId):
+            return self._bot_object._frame_store.group_of_types(self._frame_group, (unit_types.value,))
+        assert all(isinstance(t, UnitTypeId) for t in unit_types), f"Not all ids in selection are of type UnitTypeId"
+        return self._bot_object._frame_store.group_of_types(
+            self._frame_group, [unit_type.value for unit_type in unit_types]
+        )
+
     def copy(self):
         return self.subgroup(self)
 
+    def _clear_array_cache(self):
+        self._positions = None
+        self._indices = None
+        self._indices_store = None
+        self._frame_group = None
+        self._frame_group_store = None
+
+    # The following functions change the amount or order of units, so the cached arrays have to be reset
+
+    def append(self, unit: Unit):
+        super().append(unit)
+        self._clear_array_cache()
+
+    def extend(self, units: Iterable[Unit]):
+        super().extend(units)
+        self._clear_array_cache()
+
+    def insert(self, index: int, unit: Unit):
+        super().insert(index, unit)
+        self._clear_array_cache()
+
+    def remove(self, unit: Unit):
+        super().remove(unit)
+        self._clear_array_cache()
+
+    def pop(self, index: int = -1) -> Unit:
+        self._clear_array_cache()
+        return super().pop(index)
+
+    def clear(self):
+        super().clear()
+        self._clear_array_cache()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._clear_array_cache()
+
+    def reverse(self):
+        super().reverse()
+        self._clear_array_cache()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._clear_array_cache()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._clear_array_cache()
+
+    def __iadd__(self, other: Iterable[Unit]) -> Units:
+        self._clear_array_cache()
+        return super().__iadd__(other)
+
+    def __imul__(self, n: int) -> Units:
+        self._clear_array_cache()
+        return super().__imul__(n)
+
     def __or__(self, other: Units) -> Units:
         return Units(
             chain(
@@ -125,12 +218,82 @@ class Units(list):
         else:
             return self.subgroup(random.sample(self, n))
 
-    # TODO: append, insert, remove, pop and extend functions should reset the cache for Units.positions because the number of units in the list has changed
-    # @property_immutable_cache
-    # def positions(self) -> np.ndarray:
-    #     flat_units_positions = (coord for unit in self for coord in unit.position)
-    #     unit_positions_np = np.fromiter(flat_units_positions, dtype=float, count=2 * len(self)).reshape((len(self), 2))
-    #     return unit_positions_np
+    @property
+    def positions(self) -> np.ndarray:
+        """ Returns the positions of all units as float32 numpy array of shape (n, 2).
+        The array is cached until the amount or order of units in this object changes, do not modify it. """
+        if self._positions is None:
+            indices = self._frame_indices
+            if indices is not None:
+                # All units are from the current frame, take the positions from the frame store
+                self._positions = self._bot_object._frame_store.positions[indices]
+            else:
+                flat_units_positions = (coord for unit in self for coord in unit.position_tuple)
+                self._positions = np.fromiter(flat_units_positions, dtype=np.float32, count=2 * len(self)).reshape(
+                    (len(self), 2)
+                )
+        return self._positions
+
+    @property
+    def _frame_indices(self) -> Optional[np.ndarray]:
+        """ Returns the indices of the units in the frame store of the current frame.
+        Returns None if not all units were taken from the current frame. """
+        frame_store = getattr(self._bot_object, "_frame_store", None)
+        if frame_store is None:
+            return None
+        if self._indices is None or self._indices_store is not frame_store:
+            # Not computed yet, or computed in an earlier frame
+            indices = frame_store.indices_of(self)
+            if indices is None:
+                return None
+            self._indices = indices
+            self._indices_store = frame_store
+        return self._indices
+
+    def _frame_column(self, column: str) -> Optional[np.ndarray]:
+        """ Returns the values of a column of the frame store (e.g. 'type_id' or 'build_progress') for the units in this object.
+        Returns None if not all units were taken from the current frame. """
+        indices = self._frame_indices
+        if indices is None:
+            return None
+        return getattr(self._bot_object._frame_store, column)[indices]
+
+    def _spatial_index_candidates(
+        self, position: Union[Unit, Point2, Point3, Tuple[float, float], np.ndarray], radius: float
+    ) -> np.ndarray:
+        """ Returns the indices (in this Units object) of the units that the spatial index of the current frame finds in 'radius' around 'position'.
+        'position' may also be an array of positions of shape (k, 2).
+        Requires all units to be taken from the current frame. """
+        if isinstance(position, Unit):
+            position = position.position_tuple
+        elif not isinstance(position, np.ndarray):
+            position = (position[0], position[1])
+        frame_store = self._bot_object._frame_store
+        is_candidate = np.zeros(len(frame_store), dtype=bool)
+        is_candidate[frame_store.indices_in_circle(position, radius)] = True
+        return np.flatnonzero(is_candidate[self._frame_indices])
+
+    def _distances_squared_to(
+        self, position: Union[Unit, Point2, Point3, Tuple[float, float]], indices: np.ndarray = None
+    ) -> np.ndarray:
+        """ Returns the squared distances of all units (or only the units at 'indices') to the position as 1d numpy array. """
+        if isinstance(position, Unit):
+            position = position.position_tuple
+        positions = self.positions if indices is None else self.positions[indices]
+        difference = positions - (position[0], position[1])
+        return np.einsum("ij,ij->i", difference, difference)
+
+    def _subgroup_of_indices(self, indices: np.ndarray) -> Units:
+        """ Creates a new Units object from an array of indices or boolean mask, and passes on the cached arrays. """
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        units = self.subgroup([self[index] for index in indices.tolist()])
+        if self._indices is not None and self._indices_store is getattr(self._bot_object, "_frame_store", None):
+            units._indices = self._indices[indices]
+            units._indices_store = self._indices_store
+        if self._positions is not None:
+            units._positions = self._positions[indices]
+        return units
 
     def in_attack_range_of(self, unit: Unit, bonus_distance: Union[int, float] = 0) -> Units:
         """
@@ -155,7 +318,30 @@ class Units(list):
 
         :param unit:
         :param bonus_distance: """
-        return self.filter(lambda x: unit.target_in_range(x, bonus_distance=bonus_distance))
+        indices = self._frame_indices
+        if not self or indices is None:
+            return self.filter(lambda x: unit.target_in_range(x, bonus_distance=bonus_distance))
+        can_attack_ground = unit.can_attack_ground
+        can_attack_air = unit.can_attack_air
+        if not can_attack_ground and not can_attack_air:
+            return self.subgroup([])
+        frame_store = self._bot_object._frame_store
+        is_flying = frame_store.is_flying[indices]
+        ground_target = ~is_flying if can_attack_ground else np.zeros(len(self), dtype=bool)
+        air_target = (
+            ~ground_target & (is_flying | (frame_store.type_id[indices] == UNIT_COLOSSUS.value))
+            if can_attack_air
+            else np.zeros(len(self), dtype=bool)
+        )
+        attack_range = np.where(ground_target, unit.ground_range, unit.air_range)
+        max_distance = unit.radius + frame_store.radius[indices] + attack_range + bonus_distance
+        # Only units found by the spatial index can be in range, the exact range check is done on those
+        candidates = self._spatial_index_candidates(unit, float(max_distance.max()))
+        in_range = candidates[
+            (ground_target | air_target)[candidates]
+            & (self._distances_squared_to(unit, candidates) <= max_distance[candidates] ** 2)
+        ]
+        return self._subgroup_of_indices(in_range)
 
     def closest_distance_to(self, position: Union[Unit, Point2, Point3]) -> float:
         """
@@ -172,9 +358,7 @@ class Units(list):
 
         :param position: """
         assert self, "Units object is empty"
-        if isinstance(position, Unit):
-            return min(self._bot_object._distance_squared_unit_to_unit(unit, position) for unit in self) ** 0.5
-        return min(self._bot_object._distance_units_to_pos(self, position))
+        return float(self._distances_squared_to(position).min()) ** 0.5
 
     def furthest_distance_to(self, position: Union[Unit, Point2, Point3]) -> float:
         """
@@ -191,9 +375,7 @@ class Units(list):
 
         :param position: """
         assert self, "Units object is empty"
-        if isinstance(position, Unit):
-            return max(self._bot_object._distance_squared_unit_to_unit(unit, position) for unit in self) ** 0.5
-        return max(self._bot_object._distance_units_to_pos(self, position))
+        return float(self._distances_squared_to(position).max()) ** 0.5
 
     def closest_to(self, position: Union[Unit, Point2, Point3]) -> Unit:
         """
@@ -209,14 +391,7 @@ class Units(list):
 
         :param position: """
         assert self, "Units object is empty"
-        if isinstance(position, Unit):
-            return min(
-                (unit1 for unit1 in self),
-                key=lambda unit2: self._bot_object._distance_squared_unit_to_unit(unit2, position),
-            )
-
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        return min(((unit, dist) for unit, dist in zip(self, distances)), key=lambda my_tuple: my_tuple[1])[0]
+        return self[int(self._distances_squared_to(position).argmin())]
 
     def furthest_to(self, position: Union[Unit, Point2, Point3]) -> Unit:
         """
@@ -232,13 +407,7 @@ class Units(list):
 
         :param position: """
         assert self, "Units object is empty"
-        if isinstance(position, Unit):
-            return max(
-                (unit1 for unit1 in self),
-                key=lambda unit2: self._bot_object._distance_squared_unit_to_unit(unit2, position),
-            )
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        return max(((unit, dist) for unit, dist in zip(self, distances)), key=lambda my_tuple: my_tuple[1])[0]
+        return self[int(self._distances_squared_to(position).argmax())]
 
     def closer_than(self, distance: Union[int, float], position: Union[Unit, Point2, Point3]) -> Units:
         """
@@ -257,15 +426,13 @@ class Units(list):
         """
         if not self:
             return self
-        if isinstance(position, Unit):
-            distance_squared = distance ** 2
-            return self.subgroup(
-                unit
-                for unit in self
-                if self._bot_object._distance_squared_unit_to_unit(unit, position) < distance_squared
-            )
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        return self.subgroup(unit for unit, dist in zip(self, distances) if dist < distance)
+        if len(self) >= SPATIAL_INDEX_MIN_UNITS and self._frame_indices is not None:
+            # Only check the units near the position which are returned by the spatial index of the current frame
+            candidates = self._spatial_index_candidates(position, distance)
+            in_distance = candidates[self._distances_squared_to(position, candidates) < distance ** 2]
+        else:
+            in_distance = self._distances_squared_to(position) < distance ** 2
+        return self._subgroup_of_indices(in_distance)
 
     def further_than(self, distance: Union[int, float], position: Union[Unit, Point2, Point3]) -> Units:
         """
@@ -284,15 +451,7 @@ class Units(list):
         """
         if not self:
             return self
-        if isinstance(position, Unit):
-            distance_squared = distance ** 2
-            return self.subgroup(
-                unit
-                for unit in self
-                if distance_squared < self._bot_object._distance_squared_unit_to_unit(unit, position)
-            )
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        return self.subgroup(unit for unit, dist in zip(self, distances) if distance < dist)
+        return self._subgroup_of_indices(distance ** 2 < self._distances_squared_to(position))
 
     def in_distance_between(
         self, position: Union[Unit, Point2, Tuple[float, float]], distance1: float, distance2: float
@@ -314,18 +473,8 @@ class Units(list):
         """
         if not self:
             return self
-        if isinstance(position, Unit):
-            distance1_squared = distance1 ** 2
-            distance2_squared = distance2 ** 2
-            return self.subgroup(
-                unit
-                for unit in self
-                if distance1_squared
-                < self._bot_object._distance_squared_unit_to_unit(unit, position)
-                < distance2_squared
-            )
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        return self.subgroup(unit for unit, dist in zip(self, distances) if distance1 < dist < distance2)
+        distances_squared = self._distances_squared_to(position)
+        return self._subgroup_of_indices((distance1 ** 2 < distances_squared) & (distances_squared < distance2 ** 2))
 
     def closest_n_units(self, position: Union[Unit, Point2], n: int) -> Units:
         """
@@ -344,7 +493,7 @@ class Units(list):
         """
         if not self:
             return self
-        return self.subgroup(self._list_sorted_by_distance_to(position)[:n])
+        return self._subgroup_of_indices(self._indices_sorted_by_distance_to(position)[:n])
 
     def furthest_n_units(self, position: Union[Unit, Point2, np.ndarray], n: int) -> Units:
         """
@@ -363,7 +512,7 @@ class Units(list):
         """
         if not self:
             return self
-        return self.subgroup(self._list_sorted_by_distance_to(position)[-n:])
+        return self._subgroup_of_indices(self._indices_sorted_by_distance_to(position)[-n:])
 
     def in_distance_of_group(self, other_units: Units, distance: float) -> Units:
         """ Returns units that are closer than distance from any unit in the other units object.
@@ -375,24 +524,15 @@ class Units(list):
         # Return self because there are no enemies
         if not self:
             return self
-        distance_squared = distance ** 2
-        if len(self) == 1:
-            if any(
-                self._bot_object._distance_squared_unit_to_unit(self[0], target) < distance_squared
-                for target in other_units
-            ):
-                return self
-            else:
-                return self.subgroup([])
-
-        return self.subgroup(
-            self_unit
-            for self_unit in self
-            if any(
-                self._bot_object._distance_squared_unit_to_unit(self_unit, other_unit) < distance_squared
-                for other_unit in other_units
-            )
-        )
+        if self._frame_indices is not None and other_units._frame_indices is not None:
+            # Query the spatial index of the current frame once for all positions of the other units
+            candidates = self._spatial_index_candidates(other_units.positions, distance)
+        else:
+            candidates = np.arange(len(self))
+        if not len(candidates):
+            return self.subgroup([])
+        closest_distances_squared = cdist(self.positions[candidates], other_units.positions, "sqeuclidean").min(axis=1)
+        return self._subgroup_of_indices(candidates[closest_distances_squared < distance ** 2])
 
     def in_closest_distance_to_group(self, other_units: Units) -> Unit:
         """
@@ -403,12 +543,49 @@ class Units(list):
         :param other_units: """
         assert self, "Units object is empty"
         assert other_units, "Given units object is empty"
-        return min(
-            self,
-            key=lambda self_unit: min(
-                self._bot_object._distance_squared_unit_to_unit(self_unit, other_unit) for other_unit in other_units
-            ),
-        )
+        distances_squared = self._bot_object._distances_squared_units_to_units(self, other_units)
+        return self[int(distances_squared.min(axis=1).argmin())]
+
+    def closest_pairs(self, other_units: Units) -> List[Tuple[Unit, Unit, float]]:
+        """
+        Returns for every unit in self a tuple of the unit, the closest unit in 'other_units' and the distance between them.
+        All distances are calculated in one go, which is a lot faster than calling 'other_units.closest_to(unit)' for every unit in self.
+
+        Example::
+
+            enemy_units = self.enemy_units.not_flying
+            if enemy_units:
+                for zergling, closest_enemy, distance in self.units(UnitTypeId.ZERGLING).closest_pairs(enemy_units):
+                    if distance < 10:
+                        self.do(zergling.attack(closest_enemy))
+
+        :param other_units: """
+        if not self:
+            return []
+        assert other_units, "Given units object is empty"
+        distances_squared = self._bot_object._distances_squared_units_to_units(self, other_units)
+        closest_indices = distances_squared.argmin(axis=1)
+        closest_distances = np.sqrt(distances_squared[np.arange(len(self)), closest_indices])
+        return [
+            (self_unit, other_units[other_index], distance)
+            for self_unit, other_index, distance in zip(self, closest_indices.tolist(), closest_distances.tolist())
+        ]
+
+    def assignment_to(self, other_units: Units) -> Dict[int, Unit]:
+        """
+        Returns a dict that maps the tag of every unit in self to the closest unit in 'other_units'.
+        Like 'closest_pairs', all distances are calculated in one go.
+
+        Example::
+
+            enemy_units = self.enemy_units.not_flying
+            if enemy_units:
+                targets = self.units(UnitTypeId.ZERGLING).assignment_to(enemy_units)
+                for zergling in self.units(UnitTypeId.ZERGLING):
+                    self.do(zergling.attack(targets[zergling.tag]))
+
+        :param other_units: """
+        return {self_unit.tag: other_unit for self_unit, other_unit, _ in self.closest_pairs(other_units)}
 
     def _list_sorted_closest_to_distance(self, position: Union[Unit, Point2], distance: float) -> List[Unit]:
         """ This function should be a bit faster than using units.sorted(key=lambda u: u.distance_to(position)) """
@@ -466,19 +643,20 @@ class Units(list):
     def sorted(self, key: callable, reverse: bool = False) -> Units:
         return self.subgroup(sorted(self, key=key, reverse=reverse))
 
+    def _indices_sorted_by_distance_to(self, position: Union[Unit, Point2], reverse: bool = False) -> np.ndarray:
+        """ Returns the indices of the units sorted by distance to position. Units with equal distance keep their order. """
+        distances_squared = self._distances_squared_to(position)
+        if reverse:
+            distances_squared = -distances_squared
+        return np.argsort(distances_squared, kind="stable")
+
     def _list_sorted_by_distance_to(self, position: Union[Unit, Point2], reverse: bool = False) -> List[Unit]:
         """ This function should be a bit faster than using units.sorted(key=lambda u: u.distance_to(position)) """
-        if isinstance(position, Unit):
-            return sorted(
-                self, key=lambda unit: self._bot_object._distance_squared_unit_to_unit(unit, position), reverse=reverse
-            )
-        distances = self._bot_object._distance_units_to_pos(self, position)
-        unit_dist_dict = {unit.tag: dist for unit, dist in zip(self, distances)}
-        return sorted(self, key=lambda unit2: unit_dist_dict[unit2.tag], reverse=reverse)
+        return [self[index] for index in self._indices_sorted_by_distance_to(position, reverse=reverse).tolist()]
 
     def sorted_by_distance_to(self, position: Union[Unit, Point2], reverse: bool = False) -> Units:
         """ This function should be a bit faster than using units.sorted(key=lambda u: u.distance_to(position)) """
-        return self.subgroup(self._list_sorted_by_distance_to(position, reverse=reverse))
+        return self._subgroup_of_indices(self._indices_sorted_by_distance_to(position, reverse=reverse))
 
     def tags_in(self, other: Union[Set[int], List[int], Dict[int, Any]]) -> Units:
         """ Filters all units that have their tags in the 'other' set/list/dict
@@ -523,6 +701,11 @@ class Units(list):
             other = {other}
         elif isinstance(other, list):
             other = set(other)
+        if self._current_frame_group is not None:
+            return self._select_from_type_buckets(set(other))
+        type_ids = self._frame_column("type_id")
+        if type_ids is not None:
+            return self._subgroup_of_indices(np.isin(type_ids, [unit_type.value for unit_type in other]))
         return self.filter(lambda unit: unit.type_id in other)
 
     def exclude_type(self, other: Union[UnitTypeId, Set[UnitTypeId], List[UnitTypeId], Dict[UnitTypeId, Any]]) -> Units:
@@ -539,6 +722,9 @@ class Units(list):
             other = {other}
         elif isinstance(other, list):
             other = set(other)
+        type_ids = self._frame_column("type_id")
+        if type_ids is not None:
+            return self._subgroup_of_indices(~np.isin(type_ids, [unit_type.value for unit_type in other]))
         return self.filter(lambda unit: unit.type_id not in other)
 
     def same_tech(self, other: Set[UnitTypeId]) -> Units:
@@ -634,16 +820,25 @@ class Units(list):
     @property
     def ready(self) -> Units:
         """ Returns all structures that are ready (construction complete). """
+        build_progress = self._frame_column("build_progress")
+        if build_progress is not None:
+            return self._subgroup_of_indices(build_progress == 1)
         return self.filter(lambda unit: unit.is_ready)
 
     @property
     def not_ready(self) -> Units:
         """ Returns all structures that are not ready (construction not complete). """
+        build_progress = self._frame_column("build_progress")
+        if build_progress is not None:
+            return self._subgroup_of_indices(build_progress != 1)
         return self.filter(lambda unit: not unit.is_ready)
 
     @property
     def idle(self) -> Units:
         """ Returns all units or structures that are doing nothing (unit is standing still, structure is doing nothing). """
+        order_count = self._frame_column("order_count")
+        if order_count is not None:
+            return self._subgroup_of_indices(order_count == 0)
         return self.filter(lambda unit: unit.is_idle)
 
     @property
@@ -659,21 +854,33 @@ class Units(list):
     @property
     def flying(self) -> Units:
         """ Returns all units that are flying. """
+        is_flying = self._frame_column("is_flying")
+        if is_flying is not None:
+            return self._subgroup_of_indices(is_flying)
         return self.filter(lambda unit: unit.is_flying)
 
     @property
     def not_flying(self) -> Units:
         """ Returns all units that not are flying. """
+        is_flying = self._frame_column("is_flying")
+        if is_flying is not None:
+            return self._subgroup_of_indices(~is_flying)
         return self.filter(lambda unit: not unit.is_flying)
 
     @property
     def structure(self) -> Units:
         """ Deprecated: All structures. """
+        is_structure = self._frame_column("is_structure")
+        if is_structure is not None:
+            return self._subgroup_of_indices(is_structure)
         return self.filter(lambda unit: unit.is_structure)
 
     @property
     def not_structure(self) -> Units:
         """ Deprecated: All units that are not structures. """
+        is_structure = self._frame_column("is_structure")
+        if is_structure is not None:
+            return self._subgroup_of_indices(~is_structure)
         return self.filter(lambda unit: not unit.is_structure)
 
     @property